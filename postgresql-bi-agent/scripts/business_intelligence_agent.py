@@ -19,18 +19,25 @@ import json
 import argparse
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Tuple, Iterable, Iterator, Callable, TextIO
+from dataclasses import dataclass, field, asdict
 from enum import Enum
 import re
-import statistics
+import math
+import time
+import uuid
+import hashlib
+import tempfile
 from collections import defaultdict
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
 
 # PostgreSQL connection
 try:
     import psycopg2
     from psycopg2 import sql
     from psycopg2.extras import RealDictCursor
+    from psycopg2.pool import ThreadedConnectionPool
 except ImportError:
     print("Error: psycopg2 not installed. Run: pip install psycopg2-binary")
     sys.exit(1)
@@ -45,11 +52,23 @@ except ImportError:
 
 # Report generation
 try:
-    from jinja2 import Template
+    from jinja2 import Environment, StrictUndefined
 except ImportError:
     print("Error: jinja2 not installed. Run: pip install jinja2")
     sys.exit(1)
 
+# Fast JSON serialization (optional)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JIT-compiled numeric kernels (optional)
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 class Colors:
     """ANSI color codes for terminal output."""
@@ -75,6 +94,17 @@ class DatabaseConfig:
     connect_timeout: int = 30
 
 
+# libpq-style setting name -> (DatabaseConfig field, type), shared by the
+# environment and config-file loaders in main()
+_CFG: Dict[str, Tuple[str, Callable[[str], Any]]] = {
+    "PGHOST": ("host", str),
+    "PGPORT": ("port", int),
+    "PGUSER": ("user", str),
+    "PGPASSWORD": ("password", str),
+    "PGDATABASE": ("database", str),
+}
+
+
 @dataclass
 class TableMetadata:
     """Metadata for a database table."""
@@ -86,31 +116,426 @@ class TableMetadata:
     foreign_keys: List[Dict[str, str]] = field(default_factory=list)
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class BusinessQuery:
-    """A generated business intelligence query."""
+    """A generated business intelligence query (immutable and hashable)."""
     name: str
     category: str
     sql: str
     description: str
-    metrics: List[str] = field(default_factory=list)
+    metrics: Tuple[str, ...] = ()
+    round_columns: Tuple[str, ...] = ()
+    materialize: bool = False
+    refresh_interval: Optional[timedelta] = None
+    ddl: Optional[str] = None
+    refresh_sql: Optional[str] = None
+    setup_sql: Optional[Tuple[str, ...]] = None
+    # (column, dtype) pairs read in full into NumPy arrays while streaming;
+    # the row dicts in ``data`` stay capped like every other query
+    stream_columns: Tuple[Tuple[str, str], ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable summary used by the generate_* skills."""
+        result = {"name": self.name, "sql": self.sql}
+        if self.materialize:
+            result["ddl"] = self.ddl
+            result["refresh_sql"] = self.refresh_sql
+            result["refresh_interval_seconds"] = int(self.refresh_interval.total_seconds())
+        if self.setup_sql:
+            result["setup_sql"] = list(self.setup_sql)
+        return result
+
+
+# How each KPI calculate_business_metrics produces is shown in the report.
+_KPI_FORMAT: Dict[str, str] = {
+    "total_revenue": "money",
+    "avg_daily_revenue": "money",
+    "revenue_growth_wo_w": "pct",
+    "total_orders": "int",
+    "avg_daily_orders": "int",
+    "average_order_value": "money",
+    "average_ltv": "money",
+    "avg_customer_lifespan_months": "raw",
+    "top_product_units_sold": "raw",
+    "top_product_revenue": "money",
+    "avg_fulfillment_hours": "raw",
+}
+
+_FORMATTERS: Dict[str, Callable[[Any], str]] = {
+    "money": lambda v: f"${v:,.2f}",
+    "pct": lambda v: f"{v}%",
+    "int": lambda v: f"{v:,.0f}",
+    "raw": str,
+}
+
+# Threshold insights: (metric, condition, metrics that must also be > 0, insight).
+# Metrics are looked up in the merged kpis/ratios; descriptions are
+# str.format templates over those metrics plus ``v`` (the tested value)
+# and ``abs_v``. At most one rule per metric can match.
+_INSIGHT_RULES: Tuple[Tuple[str, Callable[[Any], bool], Tuple[str, ...], Dict[str, str]], ...] = (
+    ("revenue_growth_wo_w", lambda v: v > 10, ("total_revenue",), {
+        "type": "opportunity",
+        "title": "Strong Revenue Growth Momentum",
+        "description": "Revenue grew {v:.1f}% week-over-week, reaching ${total_revenue:,.0f} this period.",
+        "impact": "high",
+        "recommendation": "Capitalize on this momentum by increasing marketing spend on top-performing channels and considering promotional campaigns."
+    }),
+    ("revenue_growth_wo_w", lambda v: v < -10, ("total_revenue",), {
+        "type": "risk",
+        "title": "Revenue Declining Significantly",
+        "description": "Revenue dropped {abs_v:.1f}% week-over-week, indicating potential issues.",
+        "impact": "high",
+        "recommendation": "Investigate root causes immediately - check for technical issues, competitor activity, or marketing campaign performance."
+    }),
+    ("high_value_ratio", lambda v: v > 20, ("average_ltv",), {
+        "type": "opportunity",
+        "title": "Strong High-Value Customer Base",
+        "description": "High-value customers represent {v:.1f}% of your base with an average LTV of ${average_ltv:.0f}.",
+        "impact": "high",
+        "recommendation": "Focus on retention programs and personalized offers for this segment to maximize LTV and word-of-mouth referrals."
+    }),
+    ("avg_fulfillment_hours", lambda v: v > 48, (), {
+        "type": "risk",
+        "title": "Slow Order Fulfillment",
+        "description": "Average fulfillment time is {v:.1f} hours, which may impact customer satisfaction.",
+        "impact": "medium",
+        "recommendation": "Review fulfillment operations - consider faster shipping options or warehouse optimization."
+    }),
+    ("avg_fulfillment_hours", lambda v: 0 < v < 24, (), {
+        "type": "opportunity",
+        "title": "Excellent Fulfillment Speed",
+        "description": "Average fulfillment time is {v:.1f} hours, well above industry average.",
+        "impact": "medium",
+        "recommendation": "Highlight fast shipping in marketing materials as a competitive advantage."
+    }),
+    ("return_rate", lambda v: v > 15, (), {
+        "type": "risk",
+        "title": "High Return Rate",
+        "description": "Return rate is {v:.1f}%, significantly above industry benchmark of 8-10%.",
+        "impact": "high",
+        "recommendation": "Analyze return reasons, improve product descriptions and photos, consider size guides for apparel."
+    }),
+    ("return_rate", lambda v: 0 < v < 5, (), {
+        "type": "opportunity",
+        "title": "Low Return Rate Advantage",
+        "description": "Return rate of {v:.1f}% is well below industry average, indicating high customer satisfaction.",
+        "impact": "medium",
+        "recommendation": "Use low return rate as a selling point in marketing campaigns."
+    }),
+)
+
+
+# Business ratio -> (display name, typical range) shown in the report
+_BENCHMARKS: Dict[str, Tuple[str, str]] = {
+    "return_rate": ("Return Rate", "8-10%"),
+    "fulfillment_rate": ("Fulfillment Rate", ">95%"),
+    "high_value_ratio": ("High-Value Customer %", "15-20%"),
+    "conversion_rate": ("Conversion Rate", "2-5%")
+}
+
+# Status -> emoji lookups; callers supply the fallback with .get()
+_HEALTH_EMOJI = {"healthy": "🟢", "stable": "🟡"}
+_ANOMALY_EMOJI = {"spike": "📈", "drop": "📉"}
+_INSIGHT_EMOJI = {"opportunity": "🚀", "risk": "⚠️"}
+_PRIORITY_EMOJI = {"high": "🔴", "medium": "🟡", "low": "🟢"}
+
+# Cleared by _use_plain_output() for piped runs and --plain
+_EMOJI_ENABLED = True
+
+
+def _icon(emoji: str) -> str:
+    """``emoji`` and a separating space, or nothing in plain mode."""
+    return f"{emoji} " if _EMOJI_ENABLED else ""
+
+
+def _use_plain_output():
+    """Drop ANSI colors and emoji from console output and Markdown reports."""
+    global _EMOJI_ENABLED
+    _EMOJI_ENABLED = False
+    for name in list(vars(Colors)):
+        if name.isupper():
+            setattr(Colors, name, "")
+
+
+def _print_section(title: str):
+    """Print a step's cyan section banner with a single write."""
+    rule = f"{Colors.CYAN}{'=' * 60}{Colors.END}"
+    print(f"\n{rule}\n{Colors.CYAN}{title}{Colors.END}\n{rule}\n")
+
+
+def _kpi_row(kpi: str, value: Any) -> str:
+    """KPI table row, built in one join instead of one template write per cell."""
+    if _EMOJI_ENABLED:
+        status = "✅" if value else "⚠️"
+    else:
+        status = "OK" if value else "CHECK"
+    return "".join((
+        "| ", kpi.replace("_", " ").title(),
+        " | ", _FORMATTERS[_KPI_FORMAT.get(kpi, "raw")](value),
+        " | ", status, " |"
+    ))
+
+
+def _ratio_row(ratio: str, value: float) -> str:
+    """Business ratio table row with its benchmark range."""
+    return "".join((
+        "| ", ratio.replace("_", " ").title(),
+        " | ", f"{value}%" if value < 100 else f"{value:,.2f}",
+        " | ", _BENCHMARKS.get(ratio, ("", ""))[1], " |"
+    ))
+
+
+# Markdown report layout. Compiled once at import; trim_blocks/lstrip_blocks
+# let block tags sit on their own lines without leaving blank lines behind.
+_MD_SOURCE = """\
+# {{ icon('📊') }}Business Intelligence Report
+
+**Generated:** {{ report['generated_at'] }}
+**Analysis Period:** {{ report['analysis_period'] }}
+**Database:** {{ report['database'] }}
+
+## {{ icon('🎯') }}Executive Summary
+
+**Overall Health:** {{ icon(health_emoji) }}{{ summary['overall_health'].upper() }}
+
+### Key Metrics
+
+| Metric | Value |
+|--------|-------|
+| Total Revenue | ${{ '{:,.2f}'.format(summary['total_revenue']) }} |
+| Total Orders | {{ '{:,}'.format(summary['total_orders']) }} |
+| Average Order Value | ${{ '{:.2f}'.format(summary['average_order_value']) }} |
+
+{% if summary['critical_alerts'] %}
+### {{ icon('🚨') }}Critical Alerts
+
+{% for alert in summary['critical_alerts'] %}
+- {{ alert }}
+{% endfor %}
+
+{% endif %}
+{% if summary['key_wins'] %}
+### {{ icon('🏆') }}Key Wins
+
+{% for win in summary['key_wins'] %}
+- {{ win }}
+{% endfor %}
+
+{% endif %}
+## {{ icon('📈') }}Key Performance Indicators
+
+| KPI | Value | Status |
+|-----|-------|--------|
+{% for kpi, value in report['key_metrics'].items() %}
+{{ kpi_row(kpi, value) }}
+{% endfor %}
+
+{% if report['business_ratios'] %}
+## {{ icon('📊') }}Business Ratios
+
+| Ratio | Value | Benchmark |
+|-------|-------|-----------|
+{% for ratio, value in report['business_ratios'].items() %}
+{{ ratio_row(ratio, value) }}
+{% endfor %}
+
+{% endif %}
+{% if report['insights'] %}
+## {{ icon('💡') }}Insights & Analysis
+
+{% for insight in report['insights'] %}
+### {{ icon(insight_emoji.get(insight['type'], '💡')) }}{{ loop.index }}. {{ insight['title'] }}
+
+**Impact:** {{ insight['impact'].upper() }}
+
+{{ insight['description'] }}
+
+**Recommendation:** {{ insight['recommendation'] }}
+
+{% endfor %}
+{% endif %}
+{% if report['recommendations'] %}
+## {{ icon('🎯') }}Action Items
+
+{% for rec in report['recommendations'] %}
+{{ icon(priority_emoji.get(rec['priority'], '🟡')) }}**{{ rec['title'] }}**
+
+{{ rec['action'] }}
+
+{% endfor %}
+{% endif %}
+{% if report.get('anomalies', {}).get('anomalies') %}
+## {{ icon('🔍') }}Detected Anomalies
+
+{% for anomaly in report['anomalies']['anomalies'] %}
+{{ icon(anomaly_emoji.get(anomaly['type'], '📉')) }}**{{ anomaly['metric'].title() }}** - {{ anomaly['date'] }}
+- Deviation: {{ '{:.1f}'.format(anomaly['z_score']) }}σ from average
+- Actual: {{ '{:,.2f}'.format(anomaly['actual_value']) }} vs Expected: {{ '{:,.2f}'.format(anomaly['expected_value']) }}
+
+{% endfor %}
+{% endif %}
+## {{ icon('📋') }}Report Metadata
+
+- **Queries Executed:** {{ report['metadata']['total_queries'] }}
+- **Successful Queries:** {{ report['metadata']['successful_queries'] }}
+- **Tables Analyzed:** {{ report['metadata']['tables_analyzed'] }}
+- **Relationships Discovered:** {{ report['metadata']['relationships_discovered'] }}
+
+---
+*Report generated by PostgreSQL Business Intelligence Agent*
+*Next report recommended in 7 days*
+"""
+
+_MD_TEMPLATE = Environment(
+    autoescape=False, trim_blocks=True, lstrip_blocks=True, undefined=StrictUndefined
+).from_string(_MD_SOURCE)
+
+
+def _count_filter(predicate: str, total: Optional[str] = None) -> str:
+    """SQL counting rows that match a predicate, or their percentage of ``total``.
+
+    FILTER is a conditional increment in the aggregate node; unlike
+    COUNT(CASE WHEN ... THEN 1 END) it builds no per-row CASE/NULL value.
+    """
+    count = f"COUNT(*) FILTER (WHERE {predicate})"
+    if total is None:
+        return count
+    return f"{count} * 100.0 / NULLIF({total}, 0)"
+
+
+# NUMERIC decoded straight to float on the pooled BI connections. The
+# aggregates only feed ratios, means and report formatting, so building a
+# Decimal per value (and converting it again later) is wasted work.
+_NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, "NUMERIC_AS_FLOAT",
+    lambda value, cursor: float(value) if value is not None else None
+)
+
+
+def _json_default(obj: Any) -> Any:
+    """JSON stand-in for values JSON has no type for."""
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    return str(obj)
+
+
+def _json_bytes(obj: Any) -> bytes:
+    """Serialize ``obj`` as indented JSON, in C via orjson when it is installed.
+
+    NumPy arrays and scalars become lists and numbers; other values JSON
+    has no type for (Decimal, date, ...) are written with ``str``. Both
+    paths produce the same output. orjson's own NumPy support is not
+    used because it writes datetime64 days as timestamps and NaT as 1970.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_json_default, option=(
+            orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        ))
+    return json.dumps(obj, indent=2, default=_json_default).encode()
+
+
+def _column_array(rows: List[Dict[str, Any]], key: str) -> np.ndarray:
+    """Non-empty values of one result column as a float64 NumPy array.
+
+    Missing, NULL and zero values are masked out so reductions over the
+    array match the ``[r.get(k) for r in rows if r.get(k)]`` filters
+    they replace.
+    """
+    values = np.fromiter((row.get(key) or 0 for row in rows), dtype=np.float64, count=len(rows))
+    return values[values != 0]
+
+
+def _zscore_outliers_welford(values: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Indices and z-scores of values more than ``threshold`` sample std devs from the mean.
+
+    Mean and variance come from a single Welford pass; written as plain
+    loops so Numba can compile it to a tight native kernel.
+    """
+    n = values.shape[0]
+    mean = 0.0
+    m2 = 0.0
+    for i in range(n):
+        delta = values[i] - mean
+        mean += delta / (i + 1)
+        m2 += delta * (values[i] - mean)
+    std = math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+    
+    hits = 0
+    if std > 0:
+        for i in range(n):
+            if abs((values[i] - mean) / std) > threshold:
+                hits += 1
+    indices = np.empty(hits, dtype=np.int64)
+    z_scores = np.empty(hits, dtype=np.float64)
+    j = 0
+    if std > 0:
+        for i in range(n):
+            z = (values[i] - mean) / std
+            if abs(z) > threshold:
+                indices[j] = i
+                z_scores[j] = z
+                j += 1
+    return indices, z_scores, mean
+
+
+def _zscore_outliers_numpy(values: np.ndarray, threshold: float) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Vectorized equivalent of ``_zscore_outliers_welford`` used without Numba."""
+    mean = float(values.mean()) if values.size else 0.0
+    std = float(values.std(ddof=1)) if values.size > 1 else 0.0
+    if std <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), mean
+    z_scores = (values - mean) / std
+    indices = np.nonzero(np.abs(z_scores) > threshold)[0]
+    return indices, z_scores[indices], mean
+
+
+# cache=True keeps the compiled kernel on disk so only the first run pays for it
+_zscore_outliers = (
+    njit(cache=True, fastmath=True)(_zscore_outliers_welford)
+    if njit is not None else _zscore_outliers_numpy
+)
 
 
 class PostgreSQLBIAgent:
     """Main Business Intelligence Agent class."""
+
+    # Pooled sessions for concurrent BI query execution, opened on the
+    # first execute_all_queries() so metadata-only skills hold one backend
+    POOL_MIN_CONNECTIONS = 4
+    POOL_MAX_CONNECTIONS = 16
+    # Rows per round trip when a query's stream_columns are read in full
+    STREAM_ITERSIZE = 10000
     
     def __init__(self, config: DatabaseConfig, sample_size: int = 1000, 
-                 date_range_days: int = 30, output_dir: str = "output"):
-        """Initialize the BI Agent."""
+                 date_range_days: int = 30, output_dir: str = "output",
+                 materialize_views: bool = False, query_timeout: int = 60,
+                 cache_ttl: int = 0):
+        """Initialize the BI Agent.
+
+        ``cache_ttl`` > 0 reuses BI query results cached on disk under
+        ``output_dir/.qcache`` for that many seconds; 0 (the default) always
+        queries the database.
+        """
         self.config = config
         self.sample_size = sample_size
         self.date_range_days = date_range_days
+        self.materialize_views = materialize_views
+        self.query_timeout = query_timeout
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.cache_ttl = cache_ttl
+        self.cache_dir = self.output_dir / ".qcache"
         
         self.connection = None
+        self.pool: Optional[ThreadedConnectionPool] = None
         self.metadata: Dict[str, Any] = {}
+        self._table_index: Optional[Dict[str, str]] = None
+        self._has_hll: Optional[bool] = None
+        self._prepared: Dict[str, str] = {}
+        # Results of the idempotent discovery/profiling steps, by step name
+        self._done: Dict[str, Any] = {}
         self.query_results: Dict[str, Any] = {}
+        self._data_by_name: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
         self.business_metrics: Dict[str, Any] = {}
         self.insights: List[Dict[str, Any]] = []
         
@@ -126,6 +551,8 @@ class PostgreSQLBIAgent:
                 connect_timeout=self.config.connect_timeout
             )
             self.connection.autocommit = True
+            self._prepared.clear()
+            self._done.clear()
             print(f"{Colors.GREEN}✓ Connected to {self.config.database}@"
                   f"{self.config.host}:{self.config.port}{Colors.END}")
             return True
@@ -133,37 +560,202 @@ class PostgreSQLBIAgent:
             print(f"{Colors.RED}✗ Connection failed: {e}{Colors.END}")
             return False
     
+    def _open_pool(self) -> ThreadedConnectionPool:
+        """The pool used for BI queries, opened on first use.
+
+        Every pooled session gets a statement_timeout so one stuck query
+        cannot hold a connection indefinitely.
+        """
+        if self.pool is None:
+            self.pool = ThreadedConnectionPool(
+                self.POOL_MIN_CONNECTIONS, self.POOL_MAX_CONNECTIONS,
+                options=f"-c statement_timeout={self.query_timeout * 1000}",
+                **asdict(self.config)
+            )
+        return self.pool
+    
     def disconnect(self):
-        """Close database connection."""
+        """Close database connection and pool."""
+        if self.pool:
+            self.pool.closeall()
+            self.pool = None
         if self.connection:
             self.connection.close()
             self.connection = None
+        # Prepared statements die with the session
+        self._prepared.clear()
     
     def execute_query(self, query: str, params: tuple = None, 
-                      timeout: int = 60) -> List[Dict[str, Any]]:
-        """Execute a query and return results as list of dictionaries."""
-        if not self.connection:
+                      timeout: int = 60, connection=None,
+                      max_rows: Optional[int] = None,
+                      prepare: bool = False) -> List[Dict[str, Any]]:
+        """Execute a query and return results as list of dictionaries.
+
+        Runs on the agent's own connection unless ``connection`` is given
+        (e.g. one checked out of a pool by a worker thread). With
+        ``max_rows`` at most that many rows are transferred, see
+        ``_fetch_capped``. ``prepare`` is for statements re-run with
+        different ``params`` on the agent's connection, see ``_prepared_name``.
+        """
+        connection = connection or self.connection
+        if not connection:
             raise Exception("Not connected to database")
         
         try:
-            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            if max_rows is not None:
+                return self._fetch_capped(query, params, max_rows, connection)[0]
+            if prepare and connection is self.connection:
+                name = self._prepared_name(query, connection)
+                query = f"EXECUTE {name} ({', '.join(['%s'] * len(params or ()))})" if params else f"EXECUTE {name}"
+            with connection.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute(query, params)
-                columns = [desc[0] for desc in cursor.description]
-                results = []
-                for row in cursor:
-                    row_dict = dict(row)
-                    # Convert special types
-                    for key, value in row_dict.items():
-                        if isinstance(value, (datetime, timedelta)):
-                            row_dict[key] = str(value)
-                        elif isinstance(value, (np.integer, np.floating)):
-                            row_dict[key] = float(value)
-                    results.append(row_dict)
-                return results
+                return [self._row_to_dict(row) for row in cursor]
         except Exception as e:
             print(f"{Colors.YELLOW}Query error: {e}{Colors.END}")
             raise
-    
+
+    def _prepared_name(self, query: str, connection) -> str:
+        """Server-side prepared statement for ``query``, PREPAREd on first use.
+
+        Parsing and planning happen once per session instead of once per
+        call, which matters for the per-table catalog queries run during
+        discovery. psycopg2 ``%s`` placeholders become ``$n`` parameters.
+        """
+        key = hashlib.sha1(query.encode()).hexdigest()
+        name = self._prepared.get(key)
+        if name is None:
+            name = f"bi_stmt_{key[:16]}"
+            parts = query.split("%s")
+            body = "".join(
+                part + (f"${i}" if i < len(parts) else "")
+                for i, part in enumerate(parts, start=1)
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f"PREPARE {name} AS {body}")
+            self._prepared[key] = name
+        return name
+
+    @staticmethod
+    def _row_to_dict(row) -> Dict[str, Any]:
+        """Convert a result row to a JSON-friendly dictionary."""
+        row_dict = dict(row)
+        # Convert special types
+        for key, value in row_dict.items():
+            if isinstance(value, (datetime, timedelta)):
+                row_dict[key] = str(value)
+            elif isinstance(value, (np.integer, np.floating)):
+                row_dict[key] = float(value)
+        return row_dict
+
+    def _fetch_capped(self, query: str, params: Optional[tuple], max_rows: int,
+                      connection) -> Tuple[List[Dict[str, Any]], int]:
+        """Fetch at most ``max_rows`` rows through a server-side cursor.
+
+        Returns the rows and the query's true row count from a single
+        execution. On an autocommit connection BEGIN, DECLARE and FETCH go
+        out as one multi-statement query. Only when the cap is reached is
+        the rest of the result skipped on the server with MOVE, so rows past
+        the cap never cross the socket. The read-only transaction is then
+        rolled back: two round trips, three when capped. A connection
+        already in a transaction gets a named cursor inside it.
+        """
+        name = f"bi_{uuid.uuid4().hex}"
+        if not connection.autocommit:
+            with connection.cursor(name=name, cursor_factory=RealDictCursor) as cursor:
+                cursor.itersize = max_rows
+                cursor.execute(query, params)
+                rows = [self._row_to_dict(row) for row in cursor.fetchmany(max_rows)]
+                total = len(rows)
+                if total == max_rows:
+                    with connection.cursor() as skip:
+                        skip.execute(f'MOVE FORWARD ALL IN "{name}"')
+                        total += skip.rowcount
+            return rows, total
+        
+        if not isinstance(query, sql.Composable):
+            query = sql.SQL(query.strip().rstrip(";"))
+        batch = sql.SQL("BEGIN; DECLARE {name} NO SCROLL CURSOR FOR {query}; FETCH FORWARD {n} FROM {name}").format(
+            name=sql.Identifier(name), query=query, n=sql.Literal(max_rows)
+        )
+        with connection.cursor(cursor_factory=RealDictCursor) as cursor:
+            try:
+                cursor.execute(batch, params)
+                rows = [self._row_to_dict(row) for row in cursor.fetchall()]
+                total = len(rows)
+                if total == max_rows:
+                    cursor.execute(sql.SQL("MOVE FORWARD ALL IN {}").format(sql.Identifier(name)))
+                    total += cursor.rowcount
+            except Exception:
+                # A ROLLBACK failing too (e.g. on a dropped connection) must
+                # not replace the error the caller reports
+                try:
+                    cursor.execute("ROLLBACK")
+                except psycopg2.Error:
+                    pass
+                raise
+            cursor.execute("ROLLBACK")
+        return rows, total
+
+    def _fetch_streamed(self, query: str, params: Optional[tuple], max_rows: int,
+                        columns: Tuple[Tuple[str, str], ...],
+                        connection) -> Tuple[List[Dict[str, Any]], int, Dict[str, np.ndarray]]:
+        """Read a whole result through a server-side cursor, STREAM_ITERSIZE rows at a time.
+
+        Each batch is fed straight into NumPy with ``np.fromiter``, one
+        array per ``(column, dtype)`` in ``columns``; only the first
+        ``max_rows`` rows are also kept as dictionaries. Client memory is
+        one batch of raw rows plus the compact arrays, not a dict per row.
+        Returns the kept rows, the true row count and the arrays. NULLs
+        become 0 in numeric arrays and NaT in datetime ones.
+        """
+        rows = []
+        chunks = {column: [] for column, _ in columns}
+        missing = {column: 0 if np.dtype(dtype).kind == "f" else None for column, dtype in columns}
+        total = 0
+        autocommit = connection.autocommit
+        connection.autocommit = False
+        try:
+            with connection.cursor(name=f"bi_{uuid.uuid4().hex}", cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(query, params)
+                while True:
+                    batch = cursor.fetchmany(self.STREAM_ITERSIZE)
+                    if not batch:
+                        break
+                    total += len(batch)
+                    rows.extend(self._row_to_dict(row) for row in batch[:max_rows - len(rows)])
+                    for column, dtype in columns:
+                        chunks[column].append(np.fromiter(
+                            (missing[column] if row[column] is None else row[column] for row in batch),
+                            dtype=dtype, count=len(batch)
+                        ))
+        except Exception:
+            # As in _fetch_capped, a failing rollback must not hide the error
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                pass
+            raise
+        connection.rollback()
+        connection.autocommit = autocommit
+        arrays = {
+            column: np.concatenate(chunks[column]) if chunks[column] else np.empty(0, dtype=dtype)
+            for column, dtype in columns
+        }
+        return rows, total, arrays
+
+    def execute_statement(self, statement: str, params: tuple = None, connection=None):
+        """Execute a statement that returns no rows (DDL, REFRESH, ...)."""
+        connection = connection or self.connection
+        if not connection:
+            raise Exception("Not connected to database")
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(statement, params)
+        except Exception as e:
+            print(f"{Colors.YELLOW}Statement error: {e}{Colors.END}")
+            raise
+
     def get_table_row_count(self, schema: str, table: str) -> int:
         """Get approximate row count for a table."""
         query = f"""
@@ -172,7 +764,7 @@ class PostgreSQLBIAgent:
             WHERE schemaname = %s AND relname = %s
         """
         try:
-            results = self.execute_query(query, (schema, table))
+            results = self.execute_query(query, (schema, table), prepare=True)
             if results:
                 return results[0].get('approximate_count', 0)
         except:
@@ -184,10 +776,14 @@ class PostgreSQLBIAgent:
     # =========================================================================
     
     def discover_database_metadata(self) -> Dict[str, Any]:
-        """Discover comprehensive database metadata."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Discovering Database Metadata{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+        """Discover comprehensive database metadata.
+
+        Computed once per connection; a rerun discards every step that was
+        derived from the previous metadata.
+        """
+        if "discover" in self._done:
+            return self._done["discover"]
+        _print_section("Discovering Database Metadata")
         
         metadata = {
             "discovery_time": datetime.now().isoformat(),
@@ -259,7 +855,7 @@ class PostgreSQLBIAgent:
                 FROM pg_indexes 
                 WHERE schemaname = %s AND tablename = %s
             """
-            indexes = self.execute_query(indexes_query, (schema_name, table_name))
+            indexes = self.execute_query(indexes_query, (schema_name, table_name), prepare=True)
             index_names = [idx["indexname"] for idx in indexes]
             
             # Get foreign keys
@@ -278,7 +874,7 @@ class PostgreSQLBIAgent:
                     AND tc.table_schema = %s
                     AND tc.table_name = %s
             """
-            foreign_keys = self.execute_query(fk_query, (schema_name, table_name))
+            foreign_keys = self.execute_query(fk_query, (schema_name, table_name), prepare=True)
             
             table_metadata = {
                 "schema_name": schema_name,
@@ -308,6 +904,9 @@ class PostgreSQLBIAgent:
         metadata["relationships"] = self.metadata.get("relationships", [])
         
         self.metadata = metadata
+        self._index_tables()
+        self._done.clear()
+        self._done["discover"] = metadata
         
         print(f"{Colors.GREEN}✓ Discovered {metadata['total_tables']} tables "
               f"in {len(metadata['schemas'])} schemas{Colors.END}")
@@ -371,9 +970,9 @@ class PostgreSQLBIAgent:
     
     def identify_business_tables(self) -> Dict[str, Any]:
         """Identify tables related to core business operations."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Identifying Business Tables{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+        if "identify" in self._done:
+            return self._done["identify"]
+        _print_section("Identifying Business Tables")
         
         # Scoring system for business relevance
         business_keywords = {
@@ -460,6 +1059,7 @@ class PostgreSQLBIAgent:
         }
         
         self.metadata["business_tables"] = result
+        self._done["identify"] = result
         
         print(f"{Colors.GREEN}✓ Identified {len(table_scores)} business-relevant tables{Colors.END}")
         print(f"  - Core tables: {len(categorized['core_tables'])}")
@@ -476,11 +1076,15 @@ class PostgreSQLBIAgent:
     # =========================================================================
     
     def sample_table_data(self, tables: List[str] = None) -> Dict[str, Any]:
-        """Sample data from business tables."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Sampling Table Data{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+        """Sample data from business tables.
+
+        Only the default sample (top business tables) is memoized.
+        """
+        if not tables and "sample" in self._done:
+            return self._done["sample"]
+        _print_section("Sampling Table Data")
         
+        explicit_tables = bool(tables)
         if not tables:
             # Use top business tables
             tables = [t["name"] for t in self.metadata.get("business_tables", {}).get("core_tables", [])[:5]]
@@ -493,10 +1097,10 @@ class PostgreSQLBIAgent:
             table = parts[-1]
             
             # Get sample data
-            sample_query = f"""
-                SELECT * FROM {schema}.{table}
+            sample_query = sql.SQL("""
+                SELECT * FROM {}
                 LIMIT %s
-            """
+            """).format(sql.Identifier(schema, table))
             try:
                 samples = self.execute_query(sample_query, (self.sample_size,))
                 
@@ -514,7 +1118,7 @@ class PostgreSQLBIAgent:
                 }
                 
                 # Get row count
-                count_query = f"SELECT COUNT(*) as cnt FROM {schema}.{table}"
+                count_query = sql.SQL("SELECT COUNT(*) as cnt FROM {}").format(sql.Identifier(schema, table))
                 count_result = self.execute_query(count_query)
                 analysis["total_rows"] = count_result[0].get("cnt", 0) if count_result else 0
                 
@@ -570,6 +1174,10 @@ class PostgreSQLBIAgent:
                 continue
         
         self.metadata["sampled_data"] = sampled_data
+        if explicit_tables:
+            self._done.pop("sample", None)
+        else:
+            self._done["sample"] = sampled_data
         
         print(f"{Colors.GREEN}✓ Sampled {len(sampled_data)} tables{Colors.END}\n")
         return sampled_data
@@ -586,9 +1194,9 @@ class PostgreSQLBIAgent:
     
     def detect_data_patterns(self) -> Dict[str, Any]:
         """Detect temporal and value patterns in the data."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Detecting Data Patterns{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+        if "patterns" in self._done:
+            return self._done["patterns"]
+        _print_section("Detecting Data Patterns")
         
         patterns = {
             "temporal_patterns": {},
@@ -612,7 +1220,7 @@ class PostgreSQLBIAgent:
         # Detect value distributions and outliers
         for table, data in sampled_data.items():
             for col, range_info in data.get("value_ranges", {}).items():
-                if "order_amount" in col.lower() or "amount" in col.lower():
+                if "amount" in col.lower():
                     values = list(range_info.values())
                     if "avg" in range_info:
                         distribution = {
@@ -625,7 +1233,7 @@ class PostgreSQLBIAgent:
                         # Calculate percentiles from sample
                         if "count" in range_info and range_info["count"] > 10:
                             try:
-                                percentiles_query = f"""
+                                percentiles_query = sql.SQL("""
                                     SELECT 
                                         PERCENTILE_CONT(0.25) WITHIN GROUP (ORDER BY {col}) as p25,
                                         PERCENTILE_CONT(0.50) WITHIN GROUP (ORDER BY {col}) as p50,
@@ -633,7 +1241,7 @@ class PostgreSQLBIAgent:
                                         PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY {col}) as p95
                                     FROM {table}
                                     WHERE {col} IS NOT NULL
-                                """
+                                """).format(col=sql.Identifier(col), table=sql.Identifier(*table.split(".")))
                                 pct_results = self.execute_query(percentiles_query)
                                 if pct_results:
                                     distribution["percentiles"] = {
@@ -662,6 +1270,7 @@ class PostgreSQLBIAgent:
                 }
         
         self.metadata["patterns"] = patterns
+        self._done["patterns"] = patterns
         
         print(f"{Colors.GREEN}✓ Detected patterns in {len(patterns['temporal_patterns'])} temporal series{Colors.END}")
         print(f"{Colors.GREEN}✓ Analyzed {len(patterns['value_distributions'])} value distributions{Colors.END}")
@@ -671,9 +1280,9 @@ class PostgreSQLBIAgent:
     
     def infer_business_context(self) -> Dict[str, Any]:
         """Infer business domain and context from metadata."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Inferring Business Context{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+        if "context" in self._done:
+            return self._done["context"]
+        _print_section("Inferring Business Context")
         
         context = {
             "business_domain": None,
@@ -694,19 +1303,21 @@ class PostgreSQLBIAgent:
         }
         
         tables = self.metadata.get("business_tables", {}).get("core_tables", [])
-        table_names_lower = " ".join([t.get("table_name", "").lower() for t in tables])
+        # Keywords above are already lowercase; table names are lowered once
+        names_lower = [t.get("table_name", "").lower() for t in tables]
+        table_names_lower = " ".join(names_lower)
         
         for domain, keywords in business_domains.items():
-            match_count = sum(1 for kw in keywords if kw.lower() in table_names_lower)
+            match_count = sum(1 for kw in keywords if kw in table_names_lower)
             if match_count >= 3:
                 context["business_domain"] = domain
                 break
         
         if not context["business_domain"]:
             # Check for common business patterns
-            if any(t["table_name"].lower() in ["orders", "products", "customers"] for t in tables):
+            if any(name in ("orders", "products", "customers") for name in names_lower):
                 context["business_domain"] = "E-commerce Retail"
-            elif any(t["table_name"].lower() in ["users", "accounts", "transactions"] for t in tables):
+            elif any(name in ("users", "accounts", "transactions") for name in names_lower):
                 context["business_domain"] = "General Business"
         
         # Detect business model
@@ -760,6 +1371,7 @@ class PostgreSQLBIAgent:
             ])
         
         self.metadata["business_context"] = context
+        self._done["context"] = context
         
         print(f"{Colors.GREEN}✓ Business Domain: {context['business_domain']}{Colors.END}")
         print(f"{Colors.GREEN}✓ Business Model: {context['business_model']}{Colors.END}")
@@ -791,22 +1403,76 @@ class PostgreSQLBIAgent:
                         return col["name"]
         
         return "created_at"
+
+    def _index_ddl(self, table: str, columns: List[str]) -> str:
+        """Recommended index DDL for a table, safe to run repeatedly on a live database."""
+        index_name = f"ix_{table.split('.')[-1]}_{'_'.join(columns)}"
+        return (f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                f"ON {table} ({', '.join(columns)})")
     
-    def generate_revenue_queries(self) -> List[BusinessQuery]:
-        """Generate SQL queries for revenue analysis."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Generating Revenue Queries{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+    def _materialize(self, view_name: str, source_table: str, select_sql: str,
+                     key_columns: List[str], order_by: str,
+                     refresh_interval: timedelta = timedelta(hours=1)) -> Dict[str, Any]:
+        """Build BusinessQuery arguments that serve a heavy aggregate from a materialized view.
+
+        The join cost is paid once per REFRESH MATERIALIZED VIEW CONCURRENTLY
+        (scheduled every ``refresh_interval``) instead of on every dashboard
+        hit. CONCURRENTLY needs a unique index, hence ``key_columns``.
+        Without --materialize the plain aggregate is returned unchanged.
+        """
+        if not self.materialize_views:
+            return {"sql": select_sql}
+
+        schema = source_table.split(".")[0] if "." in source_table else "public"
+        view = f"{schema}.{view_name}"
+        return {
+            "sql": f"SELECT * FROM {view} ORDER BY {order_by}",
+            "materialize": True,
+            "refresh_interval": refresh_interval,
+            "ddl": (
+                f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view} AS {select_sql};\n"
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {view_name}_key "
+                f"ON {view} ({', '.join(key_columns)});"
+            ),
+            "refresh_sql": f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"
+        }
+
+    def _distinct_count(self, column: str) -> str:
+        """SQL counting distinct values of ``column``, approximated with HyperLogLog when available.
+
+        The ``hll`` extension keeps a fixed-size sketch instead of hashing or
+        sorting every distinct value, which is accurate enough for ratios.
+        The extension check runs once per agent; without a connection or
+        the extension, the exact COUNT(DISTINCT ...) is used.
+        """
+        if self._has_hll is None and self.connection:
+            try:
+                self._has_hll = bool(self.execute_query(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'hll'"
+                ))
+            except Exception:
+                self._has_hll = False
         
-        queries = []
+        if self._has_hll:
+            return f"hll_cardinality(hll_add_agg(hll_hash_text({column}::text)))::bigint"
+        return f"COUNT(DISTINCT {column})"
+
+    def generate_revenue_queries(self) -> Iterator[BusinessQuery]:
+        """Generate SQL queries for revenue analysis."""
         
         # Find relevant tables
         orders_table = self._find_table(["orders", "purchases", "transactions"])
         date_col = self._get_date_column(orders_table or "orders")
         
         if orders_table:
+            orders_indexes = (
+                self._index_ddl(orders_table, [date_col]),
+                self._index_ddl(orders_table, ["user_id", date_col])
+            )
+            order_items_index = self._index_ddl("order_items", ["product_id", "order_id"])
+            
             # Daily Revenue Trend
-            queries.append(BusinessQuery(
+            yield BusinessQuery(
                 name="daily_revenue_trend",
                 category="Revenue",
                 sql=f"""
@@ -814,30 +1480,96 @@ class PostgreSQLBIAgent:
                         DATE({date_col}) as date,
                         SUM(order_amount) as revenue,
                         COUNT(*) as order_count,
-                        ROUND(AVG(order_amount)::numeric, 2) as avg_order_value
+                        AVG(order_amount) as avg_order_value
                     FROM {orders_table}
                     WHERE {date_col} >= CURRENT_DATE - INTERVAL '{self.date_range_days} days'
                     GROUP BY DATE({date_col})
                     ORDER BY date
                 """,
                 description="Daily revenue, order count, and AOV for the analysis period",
-                metrics=["daily_revenue", "daily_orders", "aov", "revenue_trend"]
-            ))
-            
+                metrics=("daily_revenue", "daily_orders", "aov", "revenue_trend"),
+                round_columns=("avg_order_value",),
+                setup_sql=orders_indexes,
+                # One row per day; anomaly detection needs every day of
+                # long --date-range windows, not the first 1000
+                stream_columns=(("date", "datetime64[D]"), ("revenue", "float64"))
+            )
+
+            # Revenue KPI Rollup (one row of scalars over the daily series).
+            # The means and week-over-week growth skip days whose value is
+            # zero or NULL, like the per-metric lists this replaced; the
+            # revenue trend compares the last two calendar weeks as before
+            yield BusinessQuery(
+                name="metrics_rollup",
+                category="Revenue",
+                sql=f"""
+                    WITH daily AS (
+                        SELECT
+                            DATE({date_col}) as date,
+                            SUM(order_amount) as revenue,
+                            COUNT(*) as order_count,
+                            AVG(order_amount) as avg_order_value
+                        FROM {orders_table}
+                        WHERE {date_col} >= CURRENT_DATE - INTERVAL '{self.date_range_days} days'
+                        GROUP BY DATE({date_col})
+                    ),
+                    ranked AS (
+                        SELECT
+                            daily.*,
+                            ROW_NUMBER() OVER (ORDER BY date DESC) as day_rank,
+                            COUNT(*) FILTER (WHERE revenue <> 0) OVER (ORDER BY date DESC) as revenue_day_rank
+                        FROM daily
+                    ),
+                    rollup AS (
+                        SELECT
+                            SUM(revenue) as total_revenue,
+                            AVG(revenue) FILTER (WHERE revenue <> 0) as avg_daily_revenue,
+                            SUM(order_count)::bigint as total_orders,
+                            AVG(order_count) FILTER (WHERE order_count > 0) as avg_daily_orders,
+                            COALESCE(
+                                AVG(avg_order_value) FILTER (WHERE avg_order_value <> 0),
+                                SUM(revenue) / NULLIF(SUM(order_count), 0)
+                            ) as average_order_value,
+                            COUNT(*) as days,
+                            SUM(revenue) FILTER (WHERE day_rank <= 7) as recent_week,
+                            CASE WHEN COUNT(*) >= 14
+                                THEN SUM(revenue) FILTER (WHERE day_rank BETWEEN 8 AND 14)
+                            END as prev_week,
+                            SUM(revenue) FILTER (WHERE revenue_day_rank <= 7) as recent_revenue_week,
+                            CASE WHEN COUNT(*) FILTER (WHERE revenue <> 0) >= 14
+                                THEN SUM(revenue) FILTER (WHERE revenue_day_rank BETWEEN 8 AND 14)
+                            END as prev_revenue_week
+                        FROM ranked
+                    )
+                    SELECT
+                        rollup.*,
+                        (recent_revenue_week - prev_revenue_week) * 100.0 / NULLIF(prev_revenue_week, 0) as week_over_week_growth
+                    FROM rollup
+                """,
+                description="Revenue, order and AOV KPIs with week-over-week growth, aggregated server-side",
+                metrics=("total_revenue", "avg_daily_revenue", "week_over_week_growth", "average_order_value"),
+                setup_sql=orders_indexes
+            )
+
             # Revenue by Category
             category_table = self._find_table(["categories", "category"])
             product_table = self._find_table(["products", "items"])
             
             if category_table and product_table:
-                queries.append(BusinessQuery(
+                yield BusinessQuery(
                     name="revenue_by_category",
                     category="Revenue",
-                    sql=f"""
+                    description="Revenue breakdown by product category",
+                    metrics=("category_revenue", "category_orders", "category_aov"),
+                    round_columns=("avg_item_value",),
+                    setup_sql=orders_indexes + (order_items_index,),
+                    **self._materialize(
+                        f"mv_category_revenue_{self.date_range_days}d", orders_table, f"""
                         SELECT 
                             c.name as category,
                             SUM(oi.quantity * oi.unit_price) as revenue,
-                            COUNT(DISTINCT o.order_id) as orders,
-                            ROUND(AVG(oi.quantity * oi.unit_price)::numeric, 2) as avg_item_value,
+                            COUNT(DISTINCT o.id) as orders,
+                            AVG(oi.quantity * oi.unit_price) as avg_item_value,
                             COUNT(DISTINCT o.user_id) as unique_buyers
                         FROM {product_table} p
                         JOIN {category_table} c ON p.category_id = c.id
@@ -847,13 +1579,11 @@ class PostgreSQLBIAgent:
                         GROUP BY c.name
                         ORDER BY revenue DESC
                         LIMIT 20
-                    """,
-                    description="Revenue breakdown by product category",
-                    metrics=["category_revenue", "category_orders", "category_aov"]
-                ))
+                    """, ["category"], "revenue DESC")
+                )
             
             # Monthly Revenue Comparison
-            queries.append(BusinessQuery(
+            yield BusinessQuery(
                 name="monthly_revenue_comparison",
                 category="Revenue",
                 sql=f"""
@@ -861,20 +1591,22 @@ class PostgreSQLBIAgent:
                         DATE_TRUNC('month', {date_col}) as month,
                         SUM(order_amount) as revenue,
                         COUNT(*) as orders,
-                        ROUND(AVG(order_amount)::numeric, 2) as avg_order_value
+                        AVG(order_amount) as avg_order_value
                     FROM {orders_table}
                     WHERE {date_col} >= CURRENT_DATE - INTERVAL '12 months'
                     GROUP BY DATE_TRUNC('month', {date_col})
                     ORDER BY month
                 """,
                 description="Monthly revenue comparison for YoY analysis",
-                metrics=["monthly_revenue", "mom_growth", "yoy_growth"]
-            ))
+                metrics=("monthly_revenue", "mom_growth", "yoy_growth"),
+                round_columns=("avg_order_value",),
+                setup_sql=orders_indexes
+            )
             
             # Payment Method Breakdown
             payment_table = self._find_table(["payments", "payment"])
             if payment_table:
-                queries.append(BusinessQuery(
+                yield BusinessQuery(
                     name="revenue_by_payment_method",
                     category="Revenue",
                     sql=f"""
@@ -882,27 +1614,21 @@ class PostgreSQLBIAgent:
                             COALESCE(payment_method, 'unknown') as method,
                             COUNT(*) as transaction_count,
                             SUM(amount) as total_amount,
-                            ROUND(AVG(amount)::numeric, 2) as avg_amount,
-                            ROUND((COUNT(CASE WHEN status = 'completed' THEN 1 END)::numeric / NULLIF(COUNT(*), 0) * 100), 2) as success_rate
+                            AVG(amount) as avg_amount,
+                            {_count_filter("status = 'completed'", "COUNT(*)")} as success_rate
                         FROM {payment_table}
                         WHERE created_at >= CURRENT_DATE - INTERVAL '{self.date_range_days} days'
                         GROUP BY payment_method
                         ORDER BY total_amount DESC
                     """,
                     description="Revenue breakdown by payment method",
-                    metrics=["payment_revenue", "payment_count", "payment_success_rate"]
-                ))
-        
-        print(f"{Colors.GREEN}✓ Generated {len(queries)} revenue queries{Colors.END}\n")
-        return queries
+                    metrics=("payment_revenue", "payment_count", "payment_success_rate"),
+                    round_columns=("avg_amount", "success_rate"),
+                    setup_sql=(self._index_ddl(payment_table, ["created_at"]),)
+                )
     
-    def generate_customer_analytics_queries(self) -> List[BusinessQuery]:
+    def generate_customer_analytics_queries(self) -> Iterator[BusinessQuery]:
         """Generate SQL for customer analytics."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Generating Customer Analytics Queries{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
-        
-        queries = []
         
         users_table = self._find_table(["users", "customers", "accounts"])
         orders_table = self._find_table(["orders", "purchases", "transactions"])
@@ -911,29 +1637,26 @@ class PostgreSQLBIAgent:
             date_col = self._get_date_column(users_table)
             
             # Customer Acquisition Trend
-            queries.append(BusinessQuery(
+            yield BusinessQuery(
                 name="customer_acquisition_trend",
                 category="Customer",
                 sql=f"""
                     SELECT 
                         DATE_TRUNC('week', {date_col}) as week,
                         COUNT(*) as new_customers,
-                        COUNT(DISTINCT CASE WHEN source IN ('paid', 'organic') THEN id END) as acquired_customers
+                        COUNT(DISTINCT id) FILTER (WHERE source IN ('paid', 'organic')) as acquired_customers
                     FROM {users_table}
                     WHERE {date_col} >= CURRENT_DATE - INTERVAL '12 weeks'
                     GROUP BY DATE_TRUNC('week', {date_col})
                     ORDER BY week
                 """,
                 description="Weekly new customer acquisition trend",
-                metrics=["new_users", "user_growth_rate", "acquisition_sources"]
-            ))
+                metrics=("new_users", "user_growth_rate", "acquisition_sources")
+            )
             
             # Customer Segmentation by Value
             if orders_table:
-                queries.append(BusinessQuery(
-                    name="customer_segmentation",
-                    category="Customer",
-                    sql=f"""
+                segments_sql = f"""
                         SELECT 
                             CASE 
                                 WHEN total_spent < 100 THEN 'Low Value'
@@ -942,73 +1665,106 @@ class PostgreSQLBIAgent:
                                 ELSE 'Premium'
                             END as segment,
                             COUNT(*) as customer_count,
-                            ROUND(AVG(order_count)::numeric, 1) as avg_orders,
-                            ROUND(AVG(total_spent)::numeric, 2) as avg_ltv,
-                            ROUND(AVG(days_since_first_purchase)::numeric, 0) as avg_customer_age
+                            AVG(order_count) as avg_orders,
+                            AVG(total_spent) as avg_ltv,
+                            AVG(days_since_first_purchase) as avg_customer_age
                         FROM (
                             SELECT 
                                 u.id,
-                                u.{date_col} as first_purchase,
                                 CURRENT_DATE - DATE(u.{date_col}) as days_since_first_purchase,
-                                COALESCE(SUM(o.order_amount), 0) as total_spent,
-                                COUNT(o.id) as order_count
+                                COALESCE(o.total_spent, 0) as total_spent,
+                                COALESCE(o.order_count, 0) as order_count
                             FROM {users_table} u
-                            LEFT JOIN {orders_table} o ON u.id = o.user_id
-                            GROUP BY u.id, u.{date_col}
+                            LEFT JOIN (
+                                SELECT 
+                                    user_id,
+                                    SUM(order_amount) as total_spent,
+                                    COUNT(*) as order_count
+                                FROM {orders_table}
+                                GROUP BY user_id
+                            ) o ON u.id = o.user_id
                         ) t
                         GROUP BY segment
+                """
+                
+                yield BusinessQuery(
+                    name="customer_segmentation",
+                    category="Customer",
+                    sql=f"""{segments_sql}
                         ORDER BY avg_ltv DESC
                     """,
                     description="Customer segmentation by lifetime value and behavior",
-                    metrics=["segment_distribution", "segment_ltv", "segment_behavior"]
-                ))
+                    metrics=("segment_distribution", "segment_ltv", "segment_behavior"),
+                    round_columns=("avg_orders", "avg_ltv", "avg_customer_age")
+                )
+                
+                # Customer Metrics Rollup (one row of scalars over the segments above)
+                high_value_count = "COALESCE(SUM(customer_count) FILTER (WHERE segment = 'High Value'), 0)"
+                yield BusinessQuery(
+                    name="customer_metrics_rollup",
+                    category="Customer",
+                    sql=f"""
+                        WITH segments AS ({segments_sql})
+                        SELECT 
+                            SUM(customer_count) as total_customers,
+                            AVG(NULLIF(avg_ltv, 0)) as avg_ltv,
+                            {high_value_count} as high_value_count,
+                            {high_value_count} * 100.0 / NULLIF(SUM(customer_count), 0) as high_value_ratio
+                        FROM segments
+                    """,
+                    description="Customer count, average segment LTV and high-value share, aggregated server-side",
+                    metrics=("total_customers", "average_ltv", "high_value_ratio")
+                )
                 
                 # Customer Retention Cohort Analysis
-                queries.append(BusinessQuery(
+                yield BusinessQuery(
                     name="customer_retention_cohort",
                     category="Customer",
-                    sql=f"""
-                        WITH cohorts AS (
+                    description="Customer retention by cohort month",
+                    metrics=("cohort_retention", "cohort_size", "customer_lifespan"),
+                    round_columns=("avg_active_months", "avg_orders", "orders_per_month"),
+                    setup_sql=(self._index_ddl(orders_table, ["user_id", "created_at"]),),
+                    **self._materialize(
+                        "mv_customer_retention_cohort", orders_table, f"""
+                        WITH user_orders AS (
+                            SELECT 
+                                user_id,
+                                DATE_TRUNC('month', MIN(created_at) OVER (PARTITION BY user_id)) as cohort_month,
+                                DATE_TRUNC('month', created_at) as order_month,
+                                id as order_id
+                            FROM {orders_table}
+                        ),
+                        cohorts AS (
                             SELECT 
                                 user_id,
-                                DATE_TRUNC('month', first_purchase) as cohort_month,
-                                COUNT(DISTINCT DATE_TRUNC('month', order_date)) as active_months,
+                                cohort_month,
+                                COUNT(DISTINCT order_month) as active_months,
                                 COUNT(DISTINCT order_id) as total_orders
-                            FROM (
-                                SELECT 
-                                    user_id,
-                                    MIN(created_at) as first_purchase,
-                                    DATE_TRUNC('month', created_at) as order_date,
-                                    id as order_id
-                                FROM {orders_table}
-                                GROUP BY user_id, id
-                            ) o
-                            GROUP BY user_id, DATE_TRUNC('month', first_purchase)
+                            FROM user_orders
+                            GROUP BY user_id, cohort_month
                         )
                         SELECT 
                             cohort_month,
                             COUNT(*) as cohort_size,
-                            ROUND(AVG(active_months)::numeric, 1) as avg_active_months,
-                            ROUND(AVG(total_orders)::numeric, 1) as avg_orders,
-                            ROUND(AVG(total_orders)::numeric / NULLIF(MAX(active_months), 0), 2) as orders_per_month
+                            AVG(active_months) as avg_active_months,
+                            AVG(total_orders) as avg_orders,
+                            AVG(total_orders) / NULLIF(MAX(active_months), 0) as orders_per_month
                         FROM cohorts
                         GROUP BY cohort_month
                         ORDER BY cohort_month
-                    """,
-                    description="Customer retention by cohort month",
-                    metrics=["cohort_retention", "cohort_size", "customer_lifespan"]
-                ))
+                    """, ["cohort_month"], "cohort_month")
+                )
                 
                 # Customer Activity Levels
-                queries.append(BusinessQuery(
+                yield BusinessQuery(
                     name="customer_activity_levels",
                     category="Customer",
                     sql=f"""
                         SELECT 
                             activity_level,
                             COUNT(*) as customer_count,
-                            ROUND((COUNT(*)::numeric / SUM(COUNT(*)) OVER()) * 100, 2) as percentage,
-                            ROUND(AVG(total_spent)::numeric, 2) as avg_spent
+                            COUNT(*) * 100.0 / SUM(COUNT(*)) OVER() as percentage,
+                            AVG(total_spent) as avg_spent
                         FROM (
                             SELECT 
                                 user_id,
@@ -1028,27 +1784,22 @@ class PostgreSQLBIAgent:
                         ORDER BY avg_spent DESC
                     """,
                     description="Customer activity level distribution",
-                    metrics=["activity_distribution", "customer_value", "retention"]
-                ))
-        
-        print(f"{Colors.GREEN}✓ Generated {len(queries)} customer analytics queries{Colors.END}\n")
-        return queries
+                    metrics=("activity_distribution", "customer_value", "retention"),
+                    round_columns=("percentage", "avg_spent"),
+                    setup_sql=(self._index_ddl(orders_table, ["created_at"]),)
+                )
     
-    def generate_product_analytics_queries(self) -> List[BusinessQuery]:
+    def generate_product_analytics_queries(self) -> Iterator[BusinessQuery]:
         """Generate SQL for product/inventory analytics."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Generating Product Analytics Queries{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
-        
-        queries = []
         
         products_table = self._find_table(["products", "items", "skus"])
         orders_table = self._find_table(["orders", "purchases"])
         inventory_table = self._find_table(["inventory", "stocks"])
+        order_items_index = self._index_ddl("order_items", ["product_id", "order_id"])
         
         if products_table:
             # Product Sales Ranking
-            queries.append(BusinessQuery(
+            yield BusinessQuery(
                 name="product_sales_ranking",
                 category="Product",
                 sql=f"""
@@ -1058,7 +1809,7 @@ class PostgreSQLBIAgent:
                         COALESCE(SUM(oi.quantity), 0) as total_units_sold,
                         COALESCE(SUM(oi.quantity * oi.unit_price), 0) as total_revenue,
                         COUNT(DISTINCT o.id) as order_count,
-                        ROUND(COALESCE(SUM(oi.quantity * oi.unit_price), 0) / NULLIF(COUNT(DISTINCT o.id), 0), 2) as aov
+                        COALESCE(SUM(oi.quantity * oi.unit_price), 0) / NULLIF(COUNT(DISTINCT o.id), 0) as aov
                     FROM {products_table} p
                     LEFT JOIN order_items oi ON p.id = oi.product_id
                     LEFT JOIN {orders_table} o ON oi.order_id = o.id AND o.created_at >= CURRENT_DATE - INTERVAL '{self.date_range_days} days'
@@ -1067,37 +1818,42 @@ class PostgreSQLBIAgent:
                     LIMIT 20
                 """,
                 description="Top 20 products by revenue",
-                metrics=["product_revenue", "units_sold", "product_popularity"]
-            ))
+                metrics=("product_revenue", "units_sold", "product_popularity"),
+                round_columns=("aov",),
+                setup_sql=(order_items_index,)
+            )
             
             # Category Performance
             category_table = self._find_table(["categories", "types"])
             if category_table:
-                queries.append(BusinessQuery(
+                yield BusinessQuery(
                     name="category_performance",
                     category="Product",
-                    sql=f"""
+                    description="Performance metrics by product category",
+                    metrics=("category_revenue", "category_growth", "category_margin"),
+                    round_columns=("avg_order_value", "avg_units_per_product"),
+                    setup_sql=(order_items_index,),
+                    **self._materialize(
+                        f"mv_category_performance_{self.date_range_days}d", products_table, f"""
                         SELECT 
                             c.name as category,
                             COUNT(DISTINCT p.id) as product_count,
                             COALESCE(SUM(oi.quantity), 0) as total_units,
                             COALESCE(SUM(oi.quantity * oi.unit_price), 0) as revenue,
-                            ROUND(COALESCE(SUM(oi.quantity * oi.unit_price), 0) / NULLIF(COUNT(DISTINCT o.id), 0), 2) as avg_order_value,
-                            ROUND(COALESCE(SUM(oi.quantity), 0)::numeric / NULLIF(COUNT(DISTINCT p.id), 0), 1) as avg_units_per_product
+                            COALESCE(SUM(oi.quantity * oi.unit_price), 0) / NULLIF(COUNT(DISTINCT o.id), 0) as avg_order_value,
+                            COALESCE(SUM(oi.quantity), 0)::numeric / NULLIF(COUNT(DISTINCT p.id), 0) as avg_units_per_product
                         FROM {category_table} c
                         LEFT JOIN {products_table} p ON c.id = p.category_id
                         LEFT JOIN order_items oi ON p.id = oi.product_id
                         LEFT JOIN {orders_table} o ON oi.order_id = o.id AND o.created_at >= CURRENT_DATE - INTERVAL '{self.date_range_days} days'
                         GROUP BY c.name
                         ORDER BY revenue DESC
-                    """,
-                    description="Performance metrics by product category",
-                    metrics=["category_revenue", "category_growth", "category_margin"]
-                ))
+                    """, ["category"], "revenue DESC")
+                )
             
             # Inventory Turnover
             if inventory_table:
-                queries.append(BusinessQuery(
+                yield BusinessQuery(
                     name="inventory_turnover",
                     category="Product",
                     sql=f"""
@@ -1108,7 +1864,7 @@ class PostgreSQLBIAgent:
                             COALESCE(SUM(oi.quantity), 0) as sales_last_30d,
                             CASE 
                                 WHEN COALESCE(i.quantity, 0) > 0 
-                                THEN ROUND((COALESCE(SUM(oi.quantity), 0)::decimal / NULLIF(i.quantity, 0)) * 30, 2)
+                                THEN COALESCE(SUM(oi.quantity), 0)::decimal / NULLIF(i.quantity, 0) * 30
                                 ELSE 0 
                             END as daily_turnover_rate,
                             CASE 
@@ -1126,115 +1882,111 @@ class PostgreSQLBIAgent:
                         ORDER BY daily_turnover_rate DESC
                     """,
                     description="Inventory turnover rates and stock status",
-                    metrics=["turnover_rate", "stock_velocity", "reorder_point"]
-                ))
-        
-        print(f"{Colors.GREEN}✓ Generated {len(queries)} product analytics queries{Colors.END}\n")
-        return queries
+                    metrics=("turnover_rate", "stock_velocity", "reorder_point"),
+                    round_columns=("daily_turnover_rate",),
+                    setup_sql=(order_items_index,)
+                )
     
-    def generate_operational_analytics_queries(self) -> List[BusinessQuery]:
+    def generate_operational_analytics_queries(self) -> Iterator[BusinessQuery]:
         """Generate SQL for operational metrics."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Generating Operational Analytics Queries{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
-        
-        queries = []
         
         orders_table = self._find_table(["orders", "purchases"])
         payments_table = self._find_table(["payments"])
         
         if orders_table:
+            orders_indexes = (self._index_ddl(orders_table, ["created_at"]),)
+            
             # Order Fulfillment Time
-            queries.append(BusinessQuery(
+            yield BusinessQuery(
                 name="order_fulfillment_time",
                 category="Operations",
                 sql=f"""
                     SELECT 
                         DATE(created_at) as date,
                         COUNT(*) as total_orders,
-                        COUNT(CASE WHEN shipped_at IS NOT NULL THEN 1 END) as fulfilled_orders,
-                        ROUND(AVG(EXTRACT(EPOCH FROM (shipped_at - created_at)) / 3600)::numeric, 1) as avg_fulfillment_hours,
-                        ROUND((COUNT(CASE WHEN shipped_at IS NOT NULL THEN 1 END)::numeric / NULLIF(COUNT(*), 0) * 100), 2) as fulfillment_rate
+                        {_count_filter("shipped_at IS NOT NULL")} as fulfilled_orders,
+                        AVG(EXTRACT(EPOCH FROM (shipped_at - created_at)) / 3600) as avg_fulfillment_hours,
+                        {_count_filter("shipped_at IS NOT NULL", "COUNT(*)")} as fulfillment_rate
                     FROM {orders_table}
                     WHERE created_at >= CURRENT_DATE - INTERVAL '{self.date_range_days} days'
                     GROUP BY DATE(created_at)
                     ORDER BY date
                 """,
                 description="Order fulfillment efficiency over time",
-                metrics=["avg_fulfillment_time", "fulfillment_rate", "orders_fulfilled"]
-            ))
+                metrics=("avg_fulfillment_time", "fulfillment_rate", "orders_fulfilled"),
+                round_columns=("avg_fulfillment_hours", "fulfillment_rate"),
+                setup_sql=orders_indexes
+            )
             
             # Order Status Distribution
-            queries.append(BusinessQuery(
+            yield BusinessQuery(
                 name="order_status_distribution",
                 category="Operations",
                 sql=f"""
                     SELECT 
                         status,
                         COUNT(*) as order_count,
-                        ROUND((COUNT(*)::numeric / (SELECT COUNT(*) FROM {orders_table} WHERE created_at >= CURRENT_DATE - INTERVAL '{self.date_range_days} days')) * 100, 2) as percentage,
-                        ROUND(AVG(order_amount)::numeric, 2) as avg_amount
+                        COUNT(*) * 100.0 / (SELECT COUNT(*) FROM {orders_table} WHERE created_at >= CURRENT_DATE - INTERVAL '{self.date_range_days} days') as percentage,
+                        AVG(order_amount) as avg_amount
                     FROM {orders_table}
                     WHERE created_at >= CURRENT_DATE - INTERVAL '{self.date_range_days} days'
                     GROUP BY status
                     ORDER BY order_count DESC
                 """,
                 description="Order status breakdown",
-                metrics=["status_distribution", "status_trends"]
-            ))
+                metrics=("status_distribution", "status_trends"),
+                round_columns=("percentage", "avg_amount"),
+                setup_sql=orders_indexes
+            )
             
             # Return Rate Analysis
-            queries.append(BusinessQuery(
+            yield BusinessQuery(
                 name="return_rate_analysis",
                 category="Operations",
                 sql=f"""
                     SELECT 
                         DATE_TRUNC('week', created_at) as week,
                         COUNT(*) as total_orders,
-                        COUNT(CASE WHEN status = 'returned' THEN 1 END) as returned_orders,
-                        ROUND((COUNT(CASE WHEN status = 'returned' THEN 1 END)::numeric / NULLIF(COUNT(*), 0) * 100), 2) as return_rate,
-                        ROUND(AVG(CASE WHEN status = 'returned' THEN order_amount END)::numeric, 2) as avg_return_value
+                        {_count_filter("status = 'returned'")} as returned_orders,
+                        {_count_filter("status = 'returned'", "COUNT(*)")} as return_rate,
+                        AVG(order_amount) FILTER (WHERE status = 'returned') as avg_return_value
                     FROM {orders_table}
                     WHERE created_at >= CURRENT_DATE - INTERVAL '12 weeks'
                     GROUP BY DATE_TRUNC('week', created_at)
                     ORDER BY week
                 """,
                 description="Weekly return rate tracking",
-                metrics=["weekly_return_rate", "return_trend", "return_value"]
-            ))
+                metrics=("weekly_return_rate", "return_trend", "return_value"),
+                round_columns=("return_rate", "avg_return_value"),
+                setup_sql=orders_indexes
+            )
         
         # Payment Success Rate
         if payments_table:
-            queries.append(BusinessQuery(
+            yield BusinessQuery(
                 name="payment_success_rate",
                 category="Operations",
                 sql=f"""
                     SELECT 
                         DATE(created_at) as date,
                         COUNT(*) as total_transactions,
-                        COUNT(CASE WHEN status = 'completed' THEN 1 END) as successful_payments,
-                        COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed_payments,
-                        ROUND((COUNT(CASE WHEN status = 'completed' THEN 1 END)::numeric / NULLIF(COUNT(*), 0) * 100), 2) as success_rate,
-                        ROUND(AVG(CASE WHEN status = 'completed' THEN amount END)::numeric, 2) as avg_payment_value
+                        {_count_filter("status = 'completed'")} as successful_payments,
+                        {_count_filter("status = 'failed'")} as failed_payments,
+                        {_count_filter("status = 'completed'", "COUNT(*)")} as success_rate,
+                        AVG(amount) FILTER (WHERE status = 'completed') as avg_payment_value
                     FROM {payments_table}
                     WHERE created_at >= CURRENT_DATE - INTERVAL '{self.date_range_days} days'
                     GROUP BY DATE(created_at)
                     ORDER BY date
                 """,
                 description="Daily payment success rates",
-                metrics=["payment_success_rate", "payment_failures", "payment_value"]
-            ))
-        
-        print(f"{Colors.GREEN}✓ Generated {len(queries)} operational analytics queries{Colors.END}\n")
-        return queries
+                metrics=("payment_success_rate", "payment_failures", "payment_value"),
+                round_columns=("success_rate", "avg_payment_value"),
+                setup_sql=(self._index_ddl(payments_table, ["created_at"]),)
+            )
     
-    def generate_marketing_analytics_queries(self) -> List[BusinessQuery]:
+    def generate_marketing_analytics_queries(self) -> Iterator[BusinessQuery]:
         """Generate SQL for marketing analytics."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Generating Marketing Analytics Queries{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
-        
-        queries = []
         
         users_table = self._find_table(["users", "customers"])
         orders_table = self._find_table(["orders", "purchases"])
@@ -1243,21 +1995,21 @@ class PostgreSQLBIAgent:
             date_col = self._get_date_column(users_table)
             
             # Channel Attribution
-            queries.append(BusinessQuery(
+            yield BusinessQuery(
                 name="channel_attribution",
                 category="Marketing",
                 sql=f"""
                     SELECT 
                         COALESCE(source, 'direct') as channel,
                         COUNT(DISTINCT user_id) as total_users,
-                        COUNT(DISTINCT CASE WHEN has_order THEN user_id END) as converters,
-                        ROUND((COUNT(DISTINCT CASE WHEN has_order THEN user_id END)::numeric / NULLIF(COUNT(DISTINCT user_id), 0) * 100), 2) as conversion_rate,
-                        ROUND(AVG(CASE WHEN total_revenue > 0 THEN total_revenue END)::numeric, 2) as avg_revenue_per_user
+                        COUNT(DISTINCT user_id) FILTER (WHERE has_order) as converters,
+                        COUNT(DISTINCT user_id) FILTER (WHERE has_order) * 100.0 / NULLIF(COUNT(DISTINCT user_id), 0) as conversion_rate,
+                        AVG(total_revenue) FILTER (WHERE total_revenue > 0) as avg_revenue_per_user
                     FROM (
                         SELECT 
                             u.id as user_id,
                             MAX(u.source) as source,
-                            MAX(CASE WHEN o.id IS NOT NULL THEN true ELSE false END) as has_order,
+                            BOOL_OR(o.id IS NOT NULL) as has_order,
                             SUM(COALESCE(o.order_amount, 0)) as total_revenue
                         FROM {users_table} u
                         LEFT JOIN {orders_table} o ON u.id = o.user_id
@@ -1268,89 +2020,66 @@ class PostgreSQLBIAgent:
                     ORDER BY converters DESC
                 """,
                 description="User acquisition and conversion by channel",
-                metrics=["channel_users", "channel_conversion", "channel_value"]
-            ))
+                metrics=("channel_users", "channel_conversion", "channel_value"),
+                round_columns=("conversion_rate", "avg_revenue_per_user")
+            )
             
             # Conversion Funnel
-            queries.append(BusinessQuery(
+            sessions = self._distinct_count("session_id")
+            yield BusinessQuery(
                 name="conversion_funnel",
                 category="Marketing",
                 sql=f"""
-                    WITH funnel AS (
-                        SELECT 
-                            'Visit' as stage,
-                            COUNT(DISTINCT session_id) as count,
-                            100.0 as percentage
-                        FROM events 
-                        WHERE event_type = 'page_view'
-                        
-                        UNION ALL
-                        
-                        SELECT 
-                            'Product View' as stage,
-                            COUNT(DISTINCT session_id) as count,
-                            ROUND((COUNT(DISTINCT session_id)::numeric / NULLIF(
-                                (SELECT COUNT(DISTINCT session_id) FROM events WHERE event_type = 'page_view'), 0
-                            ) * 100), 2) as percentage
-                        FROM events 
-                        WHERE event_type = 'product_view'
-                        
-                        UNION ALL
-                        
-                        SELECT 
-                            'Add to Cart' as stage,
-                            COUNT(DISTINCT session_id) as count,
-                            ROUND((COUNT(DISTINCT session_id)::numeric / NULLIF(
-                                (SELECT COUNT(DISTINCT session_id) FROM events WHERE event_type = 'product_view'), 0
-                            ) * 100), 2) as percentage
-                        FROM events 
-                        WHERE event_type = 'add_to_cart'
-                        
-                        UNION ALL
-                        
-                        SELECT 
-                            'Checkout' as stage,
-                            COUNT(DISTINCT session_id) as count,
-                            ROUND((COUNT(DISTINCT session_id)::numeric / NULLIF(
-                                (SELECT COUNT(DISTINCT session_id) FROM events WHERE event_type = 'add_to_cart'), 0
-                            ) * 100), 2) as percentage
-                        FROM events 
-                        WHERE event_type = 'checkout_start'
-                        
-                        UNION ALL
-                        
-                        SELECT 
-                            'Purchase' as stage,
-                            COUNT(DISTINCT session_id) as count,
-                            ROUND((COUNT(DISTINCT session_id)::numeric / NULLIF(
-                                (SELECT COUNT(DISTINCT session_id) FROM events WHERE event_type = 'checkout_start'), 0
-                            ) * 100), 2) as percentage
-                        FROM events 
-                        WHERE event_type = 'purchase'
+                    WITH stage_counts AS (
+                        SELECT event_type, {sessions} as count
+                        FROM events
+                        WHERE event_type IN ('page_view', 'product_view', 'add_to_cart', 'checkout_start', 'purchase')
+                        GROUP BY event_type
+                    ),
+                    funnel AS (
+                        SELECT s.stage_order, s.stage, COALESCE(c.count, 0) as count
+                        FROM (VALUES
+                            (1, 'page_view', 'Visit'),
+                            (2, 'product_view', 'Product View'),
+                            (3, 'add_to_cart', 'Add to Cart'),
+                            (4, 'checkout_start', 'Checkout'),
+                            (5, 'purchase', 'Purchase')
+                        ) AS s(stage_order, event_type, stage)
+                        LEFT JOIN stage_counts c USING (event_type)
                     )
-                    SELECT * FROM funnel
-                    ORDER BY count DESC
+                    SELECT 
+                        stage,
+                        count,
+                        CASE WHEN stage_order = 1 THEN 100.0
+                            ELSE count * 100.0 / NULLIF(LAG(count) OVER (ORDER BY stage_order), 0)
+                        END as percentage
+                    FROM funnel
+                    ORDER BY count DESC, stage_order
                 """,
                 description="User conversion funnel from visit to purchase",
-                metrics=["funnel_conversion", "drop_off_rates", "stage_progression"]
-            ))
+                metrics=("funnel_conversion", "drop_off_rates", "stage_progression"),
+                round_columns=("percentage",)
+            )
             
             # Coupon/Promotion Effectiveness
             coupon_table = self._find_table(["coupons", "promotions"])
             if coupon_table:
-                queries.append(BusinessQuery(
+                yield BusinessQuery(
                     name="coupon_effectiveness",
                     category="Marketing",
                     sql=f"""
                         SELECT 
                             c.code,
                             COUNT(DISTINCT o.id) as orders_with_coupon,
-                            ROUND(SUM(o.order_amount)::numeric, 2) as total_revenue,
-                            ROUND(AVG(o.order_amount)::numeric, 2) as avg_order_value,
+                            SUM(o.order_amount) as total_revenue,
+                            AVG(o.order_amount) as avg_order_value,
                             COUNT(DISTINCT u.id) as unique_users,
-                            ROUND((COUNT(DISTINCT CASE WHEN o.created_at >= c.created_at AND o.created_at <= c.created_at + INTERVAL '7 days' THEN o.id END)::numeric / NULLIF(COUNT(DISTINCT o.id), 0) * 100), 2) as redemption_rate
+                            COUNT(DISTINCT o.id) FILTER (WHERE o.created_at >= c.created_at AND o.created_at <= c.created_at + INTERVAL '7 days') * 100.0 / NULLIF(COUNT(DISTINCT o.id), 0) as redemption_rate
                         FROM {coupon_table} c
-                        LEFT JOIN {orders_table} o ON o.coupon_code = c.code
+                        LEFT JOIN {orders_table} o
+                            ON o.coupon_code = c.code
+                            AND o.created_at >= c.created_at
+                            AND o.created_at >= CURRENT_DATE - INTERVAL '30 days'
                         LEFT JOIN {users_table} u ON o.user_id = u.id
                         WHERE c.created_at >= CURRENT_DATE - INTERVAL '30 days'
                         GROUP BY c.code
@@ -1358,29 +2087,161 @@ class PostgreSQLBIAgent:
                         LIMIT 10
                     """,
                     description="Top performing coupons and promotions",
-                    metrics=["coupon_revenue", "coupon_orders", "coupon_redemption"]
-                ))
-        
-        print(f"{Colors.GREEN}✓ Generated {len(queries)} marketing analytics queries{Colors.END}\n")
-        return queries
+                    metrics=("coupon_revenue", "coupon_orders", "coupon_redemption"),
+                    round_columns=("total_revenue", "avg_order_value", "redemption_rate")
+                )
     
     # =========================================================================
     # HELPER METHODS
     # =========================================================================
     
+    def _index_tables(self):
+        """Build the lowercase table name -> qualified name lookup used by _find_table."""
+        self._table_index = {}
+        for table in self.metadata.get("tables", []):
+            # First schema wins when the same table name appears more than once
+            self._table_index.setdefault(
+                table["table_name"].lower(),
+                f"{table['schema_name']}.{table['table_name']}"
+            )
+    
     def _find_table(self, possible_names: List[str]) -> str:
         """Find a table by possible names."""
-        for name in possible_names:
-            for table in self.metadata.get("tables", []):
-                if table["table_name"].lower() == name:
-                    return f"{table['schema_name']}.{table['table_name']}"
-        return None
+        if self._table_index is None:
+            self._index_tables()
+        return next(
+            (self._table_index[name] for name in possible_names if name in self._table_index),
+            None
+        )
+    
+    def _data(self, category: str, name: str) -> List[Dict[str, Any]]:
+        """Rows returned by a query in the last execute_all_queries run ([] if missing or failed)."""
+        return self._data_by_name.get((category, name), [])
+    
+    def _columns(self, category: str, name: str) -> Dict[str, np.ndarray]:
+        """Full-length ``stream_columns`` arrays of a query in the last run ({} if none)."""
+        return self.query_results.get(category, {}).get(name, {}).get("columns", {})
+    
+    def _cache_path(self, query: BusinessQuery, max_rows: int) -> Path:
+        """On-disk cache file for a query's result as seen by this database role.
+
+        The user is part of the key because row-level security can give
+        different roles different results for the same SQL.
+        """
+        key = hashlib.blake2b(
+            f"{self.config.user}@{self.config.host}:{self.config.port}/{self.config.database}|"
+            f"{query.sql}|{self.date_range_days}|{max_rows}".encode(),
+            digest_size=16
+        ).hexdigest()
+        return self.cache_dir / f"{key}.json"
+    
+    def _cache_load(self, path: Path, query: BusinessQuery) -> Optional[Dict[str, Any]]:
+        """Cached result if ``path`` was written within cache_ttl seconds.
+
+        Entries are plain JSON, so a file planted in the output directory
+        cannot execute code; streamed columns are turned back into arrays.
+        Anything unreadable counts as a miss and the query runs against
+        the database.
+        """
+        try:
+            age = time.time() - path.stat().st_mtime
+            if age > self.cache_ttl:
+                return None
+            payload = path.read_bytes()
+            cached = orjson.loads(payload) if orjson is not None else json.loads(payload)
+            if not isinstance(cached, dict) or not isinstance(cached.get("data"), list):
+                return None
+            if query.stream_columns:
+                cached["columns"] = {
+                    column: np.array(cached["columns"][column], dtype=dtype)
+                    for column, dtype in query.stream_columns
+                }
+            cached["cache_age_seconds"] = round(age)
+            return cached
+        except Exception:
+            return None
+    
+    def _cache_store(self, path: Path, result: Dict[str, Any]):
+        """Write a result atomically so concurrent readers never see a partial file."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        f = tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False)
+        try:
+            with f:
+                f.write(_json_bytes(result))
+            os.replace(f.name, path)
+        except BaseException:
+            # Don't leave a stray .tmp behind when the write or rename fails
+            os.unlink(f.name)
+            raise
+    
+    def _run_one(self, query: BusinessQuery, max_rows: int = 1000) -> Dict[str, Any]:
+        """Run one BI query on a pooled connection (executed in a worker thread).
+
+        Only the first ``max_rows`` rows are kept; ``row_count`` still
+        reports the full result size. Queries with ``stream_columns`` are
+        read in full and also return those columns as NumPy arrays under
+        ``columns``. With ``cache_ttl`` set, a fresh cached result is
+        returned without touching the database.
+        """
+        if self.cache_ttl > 0:
+            cache_path = self._cache_path(query, max_rows)
+            start_time = time.time()
+            cached = self._cache_load(cache_path, query)
+            if cached is not None:
+                return {**cached, "execution_time": round(time.time() - start_time, 3), "cached": True}
+        
+        connection = self.pool.getconn()
+        try:
+            connection.autocommit = True
+            psycopg2.extensions.register_type(_NUMERIC_AS_FLOAT, connection)
+            start_time = time.time()
+            
+            if query.ddl:
+                # No-op once the view exists; refreshes are scheduled separately
+                self.execute_statement(query.ddl, connection=connection)
+            columns = None
+            if query.stream_columns:
+                query_results, row_count, columns = self._fetch_streamed(
+                    query.sql, None, max_rows, query.stream_columns, connection
+                )
+            else:
+                query_results, row_count = self._fetch_capped(query.sql, None, max_rows, connection)
+            # Rounded here rather than with ROUND(...::numeric) in the aggregate
+            for row in query_results:
+                for column in query.round_columns:
+                    if row.get(column) is not None:
+                        row[column] = round(float(row[column]), 2)
+            
+            execution_time = time.time() - start_time
+            result = {
+                "description": query.description,
+                "metrics": query.metrics,
+                "execution_time": round(execution_time, 3),
+                "row_count": row_count,
+                "data": query_results
+            }
+            if columns is not None:
+                result["columns"] = columns
+        finally:
+            self.pool.putconn(connection)
+        
+        if self.cache_ttl > 0:
+            self._cache_store(cache_path, result)
+        return result
     
-    def execute_all_queries(self, query_lists: Dict[str, List[BusinessQuery]]) -> Dict[str, Any]:
-        """Execute all generated queries and collect results."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Executing Business Intelligence Queries{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+    def execute_all_queries(self, query_lists: Dict[str, Iterable[BusinessQuery]],
+                            max_workers: int = 8) -> Dict[str, Any]:
+        """Execute all generated queries and collect results.
+
+        Queries are independent, so they run concurrently on up to
+        ``max_workers`` pooled connections; psycopg2 releases the GIL while
+        waiting on the server. Every category is submitted before any result
+        is awaited, so wall time tracks the slowest query rather than the
+        sum of per-category batches. Queries are consumed lazily, so the
+        first ones are already running while later ones are being generated.
+        The pool is opened here on first use; connect() must have run.
+        """
+        _print_section("Executing Business Intelligence Queries")
         
         execution_summary = {
             "total_queries": 0,
@@ -1391,47 +2252,55 @@ class PostgreSQLBIAgent:
         }
         
         results = {}
+        wall_start = time.time()
         
-        for category, queries in query_lists.items():
-            category_results = {}
+        if not self.connection:
+            raise Exception("Not connected to database")
+        self._open_pool()
+        
+        # More workers than pooled connections would only make getconn() fail
+        max_workers = min(max_workers, self.POOL_MAX_CONNECTIONS)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            submitted = {
+                category: [(query, executor.submit(self._run_one, query)) for query in queries]
+                for category, queries in query_lists.items()
+            }
             
-            for query in queries:
-                execution_summary["total_queries"] += 1
+            for category, futures in submitted.items():
+                category_results = {}
                 
-                try:
-                    import time
-                    start_time = time.time()
-                    
-                    query_results = self.execute_query(query.sql)
-                    
-                    execution_time = time.time() - start_time
-                    execution_summary["total_execution_time"] += execution_time
-                    execution_summary["successful"] += 1
-                    
-                    category_results[query.name] = {
-                        "description": query.description,
-                        "metrics": query.metrics,
-                        "execution_time": round(execution_time, 3),
-                        "row_count": len(query_results),
-                        "data": query_results[:1000]  # Limit result size
-                    }
-                    
-                except Exception as e:
-                    execution_summary["failed"] += 1
-                    execution_summary["errors"].append({
-                        "query": query.name,
-                        "error": str(e)
-                    })
+                for query, future in futures:
+                    execution_summary["total_queries"] += 1
                     
-                    category_results[query.name] = {
-                        "description": query.description,
-                        "error": str(e),
-                        "status": "failed"
-                    }
-            
-            results[category] = category_results
+                    try:
+                        query_result = future.result()
+                        execution_summary["total_execution_time"] += query_result["execution_time"]
+                        execution_summary["successful"] += 1
+                        category_results[query.name] = query_result
+                        
+                    except Exception as e:
+                        execution_summary["failed"] += 1
+                        execution_summary["errors"].append({
+                            "query": query.name,
+                            "error": str(e)
+                        })
+                        
+                        category_results[query.name] = {
+                            "description": query.description,
+                            "error": str(e),
+                            "status": "failed"
+                        }
+                
+                results[category] = category_results
         
         self.query_results = results
+        self._data_by_name = {
+            (category, name): result["data"]
+            for category, category_results in results.items()
+            for name, result in category_results.items()
+            if "data" in result
+        }
+        execution_summary["wall_clock_time"] = round(time.time() - wall_start, 3)
         execution_summary["avg_query_time"] = round(
             execution_summary["total_execution_time"] / execution_summary["total_queries"], 3
         ) if execution_summary["total_queries"] > 0 else 0
@@ -1440,15 +2309,65 @@ class PostgreSQLBIAgent:
         
         print(f"{Colors.GREEN}✓ Executed {execution_summary['total_queries']} queries "
               f"({execution_summary['successful']} successful, {execution_summary['failed']} failed){Colors.END}")
-        print(f"{Colors.GREEN}✓ Total execution time: {execution_summary['total_execution_time']:.2f}s{Colors.END}\n")
+        cache_ages = [
+            result["cache_age_seconds"]
+            for category_results in results.values()
+            for result in category_results.values()
+            if result.get("cached")
+        ]
+        if cache_ages:
+            print(f"{Colors.YELLOW}  {len(cache_ages)} results served from cache "
+                  f"(oldest {max(cache_ages)}s old; --no-cache to bypass){Colors.END}")
+        print(f"{Colors.GREEN}✓ Total execution time: {execution_summary['total_execution_time']:.2f}s "
+              f"({execution_summary['wall_clock_time']:.2f}s wall clock){Colors.END}\n")
         
         return results
     
+    def refresh_materialized_views(self, query_lists: Dict[str, Iterable[BusinessQuery]]) -> List[str]:
+        """Create and refresh the materialized views backing heavy aggregates."""
+        _print_section("Refreshing Materialized Views")
+        
+        refreshed = []
+        
+        for queries in query_lists.values():
+            for query in queries:
+                if not query.materialize:
+                    continue
+                try:
+                    self.execute_statement(query.ddl)
+                    self.execute_statement(query.refresh_sql)
+                    refreshed.append(query.name)
+                except Exception as e:
+                    print(f"{Colors.YELLOW}  Warning: Could not refresh {query.name}: {e}{Colors.END}")
+        
+        print(f"{Colors.GREEN}✓ Refreshed {len(refreshed)} materialized views{Colors.END}\n")
+        return refreshed
+    
+    def apply_setup_sql(self, query_lists: Dict[str, Iterable[BusinessQuery]]) -> List[str]:
+        """Run the recommended setup DDL (indexes) of all queries, once per statement."""
+        _print_section("Applying Recommended Indexes")
+        
+        statements = set()
+        applied = []
+        
+        for queries in query_lists.values():
+            for query in queries:
+                for statement in (query.setup_sql or []):
+                    if statement in statements:
+                        continue
+                    statements.add(statement)
+                    try:
+                        self.execute_statement(statement)
+                        applied.append(statement)
+                    except Exception as e:
+                        print(f"{Colors.YELLOW}  Warning: Could not apply setup statement: {e}{Colors.END}")
+        
+        print(f"{Colors.GREEN}✓ Applied {len(applied)} of {len(statements)} setup statements{Colors.END}\n")
+        return applied
+    
     def calculate_business_metrics(self) -> Dict[str, Any]:
         """Calculate key business metrics from query results."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Calculating Business Metrics{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+        _print_section("Calculating Business Metrics")
         
         metrics = {
             "kpis": {},
@@ -1456,124 +2375,83 @@ class PostgreSQLBIAgent:
             "trends": {}
         }
         
-        # Extract KPIs from revenue queries
+        # Extract KPIs from the server-side revenue rollup
         if "Revenue" in self.query_results:
-            daily_revenue = self.query_results["Revenue"].get("daily_revenue_trend", {}).get("data", [])
-            if daily_revenue:
-                revenues = [r.get("revenue", 0) for r in daily_revenue if r.get("revenue")]
-                orders = [r.get("order_count", 0) for r in daily_revenue if r.get("order_count")]
+            rollup_rows = self._data("Revenue", "metrics_rollup")
+            rollup = rollup_rows[0] if rollup_rows else {}
+            
+            if rollup.get("total_revenue"):
+                metrics["kpis"]["total_revenue"] = round(rollup["total_revenue"], 2)
+                metrics["kpis"]["avg_daily_revenue"] = round(rollup["avg_daily_revenue"], 2)
                 
-                if revenues:
-                    total_revenue = sum(revenues)
-                    avg_daily_revenue = statistics.mean(revenues)
-                    
-                    metrics["kpis"]["total_revenue"] = round(total_revenue, 2)
-                    metrics["kpis"]["avg_daily_revenue"] = round(avg_daily_revenue, 2)
-                    
-                    # Calculate growth
-                    if len(revenues) >= 7:
-                        recent_week = sum(revenues[-7:])
-                        prev_week = sum(revenues[-14:-7]) if len(revenues) >= 14 else 0
-                        if prev_week > 0:
-                            metrics["kpis"]["revenue_growth_wo_w"] = round(
-                                (recent_week - prev_week) / prev_week * 100, 2
-                            )
+                if rollup.get("week_over_week_growth") is not None:
+                    metrics["kpis"]["revenue_growth_wo_w"] = round(rollup["week_over_week_growth"], 2)
+            
+            if rollup.get("total_orders"):
+                metrics["kpis"]["total_orders"] = rollup["total_orders"]
+                metrics["kpis"]["avg_daily_orders"] = round(float(rollup["avg_daily_orders"]), 1)
                 
-                if orders:
-                    metrics["kpis"]["total_orders"] = sum(orders)
-                    metrics["kpis"]["avg_daily_orders"] = round(statistics.mean(orders), 1)
-                    
-                    # Calculate AOV
-                    if revenues and orders:
-                        aov_values = [
-                            r.get("avg_order_value", 0) 
-                            for r in daily_revenue 
-                            if r.get("avg_order_value")
-                        ]
-                        if aov_values:
-                            metrics["kpis"]["average_order_value"] = round(statistics.mean(aov_values), 2)
-                        else:
-                            metrics["kpis"]["average_order_value"] = round(
-                                total_revenue / sum(orders), 2
-                            )
+                if rollup.get("total_revenue") and rollup.get("average_order_value") is not None:
+                    metrics["kpis"]["average_order_value"] = round(float(rollup["average_order_value"]), 2)
         
         # Extract customer metrics
         if "Customer" in self.query_results:
-            segmentation = self.query_results["Customer"].get("customer_segmentation", {}).get("data", [])
-            if segmentation:
-                # Calculate customer distribution
-                total_customers = sum(s.get("customer_count", 0) for s in segmentation)
-                high_value = next((s for s in segmentation if "High" in s.get("segment", "")), None)
+            rollup_rows = self._data("Customer", "customer_metrics_rollup")
+            if rollup_rows:
+                rollup = rollup_rows[0]
                 
-                if total_customers > 0:
-                    metrics["ratios"]["high_value_ratio"] = round(
-                        (high_value.get("customer_count", 0) / total_customers * 100) 
-                        if high_value else 0, 2
-                    )
+                # Calculate customer distribution (NULL when there are no customers)
+                if rollup.get("high_value_ratio") is not None:
+                    metrics["ratios"]["high_value_ratio"] = round(float(rollup["high_value_ratio"]), 2)
                 
                 # Calculate average LTV
-                ltv_values = [s.get("avg_ltv", 0) for s in segmentation if s.get("avg_ltv")]
-                if ltv_values:
-                    metrics["kpis"]["average_ltv"] = round(statistics.mean(ltv_values), 2)
+                if rollup.get("avg_ltv"):
+                    metrics["kpis"]["average_ltv"] = round(float(rollup["avg_ltv"]), 2)
             
             # Calculate retention metrics
-            retention = self.query_results["Customer"].get("customer_retention_cohort", {}).get("data", [])
+            retention = self._data("Customer", "customer_retention_cohort")
             if retention:
-                avg_retention_months = [
-                    r.get("avg_active_months", 0) 
-                    for r in retention 
-                    if r.get("avg_active_months")
-                ]
-                if avg_retention_months:
-                    metrics["kpis"]["avg_customer_lifespan_months"] = round(statistics.mean(avg_retention_months), 1)
+                avg_retention_months = _column_array(retention, "avg_active_months")
+                if avg_retention_months.size:
+                    metrics["kpis"]["avg_customer_lifespan_months"] = round(float(avg_retention_months.mean()), 1)
         
         # Extract product metrics
         if "Product" in self.query_results:
-            product_ranking = self.query_results["Product"].get("product_sales_ranking", {}).get("data", [])
+            product_ranking = self._data("Product", "product_sales_ranking")
             if product_ranking:
-                total_units = sum(p.get("total_units_sold", 0) for p in product_ranking)
-                total_product_revenue = sum(p.get("total_revenue", 0) for p in product_ranking)
+                units_sold = float(_column_array(product_ranking, "total_units_sold").sum())
                 
-                metrics["kpis"]["top_product_units_sold"] = total_units
-                metrics["kpis"]["top_product_revenue"] = round(total_product_revenue, 2)
+                metrics["kpis"]["top_product_units_sold"] = int(units_sold) if units_sold.is_integer() else units_sold
+                metrics["kpis"]["top_product_revenue"] = round(float(_column_array(product_ranking, "total_revenue").sum()), 2)
         
         # Extract operational metrics
         if "Operations" in self.query_results:
-            fulfillment = self.query_results["Operations"].get("order_fulfillment_time", {}).get("data", [])
+            fulfillment = self._data("Operations", "order_fulfillment_time")
             if fulfillment:
-                fulfillment_hours = [
-                    f.get("avg_fulfillment_hours", 0) 
-                    for f in fulfillment 
-                    if f.get("avg_fulfillment_hours")
-                ]
-                if fulfillment_hours:
-                    metrics["kpis"]["avg_fulfillment_hours"] = round(statistics.mean(fulfillment_hours), 1)
+                fulfillment_hours = _column_array(fulfillment, "avg_fulfillment_hours")
+                fulfillment_rates = _column_array(fulfillment, "fulfillment_rate")
                 
-                fulfillment_rates = [
-                    f.get("fulfillment_rate", 0) 
-                    for f in fulfillment 
-                    if f.get("fulfillment_rate")
-                ]
-                if fulfillment_rates:
-                    metrics["ratios"]["avg_fulfillment_rate"] = round(statistics.mean(fulfillment_rates), 2)
+                if fulfillment_hours.size:
+                    metrics["kpis"]["avg_fulfillment_hours"] = round(float(fulfillment_hours.mean()), 1)
+                
+                if fulfillment_rates.size:
+                    metrics["ratios"]["avg_fulfillment_rate"] = round(float(fulfillment_rates.mean()), 2)
             
             # Return rate
-            returns = self.query_results["Operations"].get("return_rate_analysis", {}).get("data", [])
+            returns = self._data("Operations", "return_rate_analysis")
             if returns:
-                return_rates = [r.get("return_rate", 0) for r in returns if r.get("return_rate")]
-                if return_rates:
-                    metrics["ratios"]["return_rate"] = round(statistics.mean(return_rates), 2)
+                return_rates = _column_array(returns, "return_rate")
+                if return_rates.size:
+                    metrics["ratios"]["return_rate"] = round(float(return_rates.mean()), 2)
         
-        # Calculate trends
+        # Calculate trends (prev_week is only set once 14 days of data exist)
         if "Revenue" in self.query_results:
-            trend_data = self.query_results["Revenue"].get("daily_revenue_trend", {}).get("data", [])
-            if len(trend_data) >= 14:
-                recent = [d.get("revenue", 0) for d in trend_data[-7:]]
-                older = [d.get("revenue", 0) for d in trend_data[-14:-7]]
-                
-                if sum(older) > 0:
-                    trend_direction = sum(recent) - sum(older)
-                    metrics["trends"]["revenue_trend"] = "increasing" if trend_direction > 0 else "decreasing"
+            rollup_rows = self._data("Revenue", "metrics_rollup")
+            rollup = rollup_rows[0] if rollup_rows else {}
+            
+            if (rollup.get("prev_week") or 0) > 0:
+                trend_direction = rollup["recent_week"] - rollup["prev_week"]
+                metrics["trends"]["revenue_trend"] = "increasing" if trend_direction > 0 else "decreasing"
         
         self.business_metrics = metrics
         
@@ -1585,9 +2463,7 @@ class PostgreSQLBIAgent:
     
     def detect_anomalies(self) -> Dict[str, Any]:
         """Detect anomalies in business metrics."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Detecting Anomalies{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+        _print_section("Detecting Anomalies")
         
         anomalies = {
             "anomalies": [],
@@ -1596,73 +2472,71 @@ class PostgreSQLBIAgent:
         
         # Analyze revenue for spikes/drops
         if "Revenue" in self.query_results:
-            daily_data = self.query_results["Revenue"].get("daily_revenue_trend", {}).get("data", [])
+            # Streamed in full, so long --date-range windows are not capped
+            daily = self._columns("Revenue", "daily_revenue_trend")
+            rev = daily.get("revenue")
             
-            if daily_data and len(daily_data) >= 7:
-                revenues = [d.get("revenue", 0) for d in daily_data]
-                avg_revenue = statistics.mean(revenues)
-                std_revenue = statistics.stdev(revenues) if len(revenues) > 1 else 0
+            if rev is not None and rev.size >= 7:
+                days = daily["date"]
                 
-                for i, day in enumerate(daily_data):
-                    revenue = day.get("revenue", 0)
-                    deviation = (revenue - avg_revenue) / std_revenue if std_revenue > 0 else 0
-                    
-                    if abs(deviation) > 2:  # More than 2 standard deviations
-                        anomalies["anomalies"].append({
-                            "metric": "daily_revenue",
-                            "date": day.get("date"),
-                            "actual_value": revenue,
-                            "expected_value": round(avg_revenue, 2),
-                            "deviation": round(deviation, 2),
-                            "type": "spike" if deviation > 0 else "drop",
-                            "z_score": round(deviation, 2)
-                        })
+                # More than 2 standard deviations; only flagged days become dicts
+                outliers, z_scores, avg_revenue = _zscore_outliers(rev, 2.0)
+                for i, deviation in zip(outliers.tolist(), z_scores.tolist()):
+                    anomalies["anomalies"].append({
+                        "metric": "daily_revenue",
+                        "date": str(days[i]),
+                        "actual_value": float(rev[i]),
+                        "expected_value": round(float(avg_revenue), 2),
+                        "deviation": round(deviation, 2),
+                        "type": "spike" if deviation > 0 else "drop",
+                        "z_score": round(deviation, 2)
+                    })
                 
                 # Detect weekly patterns
-                if len(daily_data) >= 14:
-                    weekdays = defaultdict(list)
-                    for day in daily_data:
-                        date = day.get("date")
-                        if date:
-                            weekday = date.strftime("%A") if isinstance(date, str) else "Unknown"
-                            weekdays[weekday].append(day.get("revenue", 0))
+                if rev.size >= 14:
+                    series = pd.Series(rev, index=pd.DatetimeIndex(days))
+                    series = series[series.index.notna()]
+                    by_dow = series.groupby(series.index.day_name()).mean()
                     
-                    weekday_avgs = {w: statistics.mean(v) for w, v in weekdays.items()}
-                    if weekday_avgs:
-                        peak_day = max(weekday_avgs, key=weekday_avgs.get)
-                        low_day = min(weekday_avgs, key=weekday_avgs.get)
+                    if not by_dow.empty:
+                        peak_day, low_day = by_dow.idxmax(), by_dow.idxmin()
+                        peak_revenue, low_revenue = float(by_dow.max()), float(by_dow.min())
                         
                         anomalies["patterns"]["weekly_seasonality"] = {
                             "peak_day": peak_day,
-                            "peak_revenue": round(weekday_avgs[peak_day], 2),
+                            "peak_revenue": round(peak_revenue, 2),
                             "low_day": low_day,
-                            "low_revenue": round(weekday_avgs[low_day], 2),
+                            "low_revenue": round(low_revenue, 2),
                             "spread": round(
-                                (weekday_avgs[peak_day] - weekday_avgs[low_day]) / weekday_avgs[low_day] * 100, 1
-                            ) if weekday_avgs[low_day] > 0 else 0
+                                (peak_revenue - low_revenue) / low_revenue * 100, 1
+                            ) if low_revenue > 0 else 0
                         }
         
         # Analyze conversion rate changes
         if "Marketing" in self.query_results:
-            funnel = self.query_results["Marketing"].get("conversion_funnel", {}).get("data", [])
+            funnel = self._data("Marketing", "conversion_funnel")
             if funnel and len(funnel) >= 3:
-                # Check for significant drop-offs
-                for i in range(1, len(funnel)):
-                    prev_count = funnel[i-1].get("count", 0)
-                    curr_count = funnel[i].get("count", 0)
-                    
-                    if prev_count > 0:
-                        drop_rate = (prev_count - curr_count) / prev_count * 100
-                        
-                        if drop_rate > 50:  # More than 50% drop-off
-                            stage = funnel[i].get("stage", "Unknown")
-                            anomalies["anomalies"].append({
-                                "metric": "funnel_drop_off",
-                                "stage": stage,
-                                "drop_rate": round(drop_rate, 2),
-                                "type": "drop_off",
-                                "severity": "high" if drop_rate > 70 else "medium"
-                            })
+                # Check for significant drop-offs between consecutive stages
+                counts = np.fromiter(
+                    (f.get("count") or 0 for f in funnel),
+                    dtype=np.float64, count=len(funnel)
+                )
+                prev_counts, curr_counts = counts[:-1], counts[1:]
+                drop_rates = np.zeros_like(curr_counts)
+                np.divide(
+                    (prev_counts - curr_counts) * 100, prev_counts,
+                    out=drop_rates, where=prev_counts > 0
+                )
+                
+                for i in np.nonzero(drop_rates > 50)[0]:  # More than 50% drop-off
+                    drop_rate = float(drop_rates[i])
+                    anomalies["anomalies"].append({
+                        "metric": "funnel_drop_off",
+                        "stage": funnel[i + 1].get("stage", "Unknown"),
+                        "drop_rate": round(drop_rate, 2),
+                        "type": "drop_off",
+                        "severity": "high" if drop_rate > 70 else "medium"
+                    })
         
         self.metadata["anomalies"] = anomalies
         
@@ -1673,88 +2547,25 @@ class PostgreSQLBIAgent:
     
     def generate_insights(self) -> List[Dict[str, Any]]:
         """Generate actionable business insights."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Generating Business Insights{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+        _print_section("Generating Business Insights")
         
         insights = []
         
-        # Revenue insights
-        total_revenue = self.business_metrics.get("kpis", {}).get("total_revenue", 0)
-        revenue_growth = self.business_metrics.get("kpis", {}).get("revenue_growth_wo_w", 0)
-        aov = self.business_metrics.get("kpis", {}).get("average_order_value", 0)
-        
-        if total_revenue > 0:
-            if revenue_growth > 10:
-                insights.append({
-                    "type": "opportunity",
-                    "title": "Strong Revenue Growth Momentum",
-                    "description": f"Revenue grew {revenue_growth:.1f}% week-over-week, reaching ${total_revenue:,.0f} this period.",
-                    "impact": "high",
-                    "recommendation": "Capitalize on this momentum by increasing marketing spend on top-performing channels and considering promotional campaigns."
-                })
-            elif revenue_growth < -10:
-                insights.append({
-                    "type": "risk",
-                    "title": "Revenue Declining Significantly",
-                    "description": f"Revenue dropped {abs(revenue_growth):.1f}% week-over-week, indicating potential issues.",
-                    "impact": "high",
-                    "recommendation": "Investigate root causes immediately - check for technical issues, competitor activity, or marketing campaign performance."
-                })
-        
-        # Customer insights
-        high_value_ratio = self.business_metrics.get("ratios", {}).get("high_value_ratio", 0)
-        avg_ltv = self.business_metrics.get("kpis", {}).get("average_ltv", 0)
-        
-        if high_value_ratio > 0 and avg_ltv > 0:
-            if high_value_ratio > 20:
-                insights.append({
-                    "type": "opportunity",
-                    "title": "Strong High-Value Customer Base",
-                    "description": f"High-value customers represent {high_value_ratio:.1f}% of your base with an average LTV of ${avg_ltv:.0f}.",
-                    "impact": "high",
-                    "recommendation": "Focus on retention programs and personalized offers for this segment to maximize LTV and word-of-mouth referrals."
-                })
-        
-        # Operational insights
-        fulfillment_hours = self.business_metrics.get("kpis", {}).get("avg_fulfillment_hours", 0)
-        return_rate = self.business_metrics.get("ratios", {}).get("return_rate", 0)
-        
-        if fulfillment_hours > 0:
-            if fulfillment_hours > 48:
-                insights.append({
-                    "type": "risk",
-                    "title": "Slow Order Fulfillment",
-                    "description": f"Average fulfillment time is {fulfillment_hours:.1f} hours, which may impact customer satisfaction.",
-                    "impact": "medium",
-                    "recommendation": "Review fulfillment operations - consider faster shipping options or warehouse optimization."
-                })
-            elif fulfillment_hours < 24:
-                insights.append({
-                    "type": "opportunity",
-                    "title": "Excellent Fulfillment Speed",
-                    "description": f"Average fulfillment time is {fulfillment_hours:.1f} hours, well above industry average.",
-                    "impact": "medium",
-                    "recommendation": "Highlight fast shipping in marketing materials as a competitive advantage."
-                })
-        
-        if return_rate > 0:
-            if return_rate > 15:
-                insights.append({
-                    "type": "risk",
-                    "title": "High Return Rate",
-                    "description": f"Return rate is {return_rate:.1f}%, significantly above industry benchmark of 8-10%.",
-                    "impact": "high",
-                    "recommendation": "Analyze return reasons, improve product descriptions and photos, consider size guides for apparel."
-                })
-            elif return_rate < 5:
-                insights.append({
-                    "type": "opportunity",
-                    "title": "Low Return Rate Advantage",
-                    "description": f"Return rate of {return_rate:.1f}% is well below industry average, indicating high customer satisfaction.",
-                    "impact": "medium",
-                    "recommendation": "Use low return rate as a selling point in marketing campaigns."
-                })
+        # Threshold insights on KPIs and ratios
+        metric_values = {
+            **self.business_metrics.get("kpis", {}),
+            **self.business_metrics.get("ratios", {})
+        }
+        for metric, condition, required, insight in _INSIGHT_RULES:
+            value = metric_values.get(metric)
+            if value is None or not condition(value):
+                continue
+            if not all((metric_values.get(name) or 0) > 0 for name in required):
+                continue
+            insights.append({
+                **insight,
+                "description": insight["description"].format(v=value, abs_v=abs(value), **metric_values)
+            })
         
         # Anomaly-based insights
         anomalies = self.metadata.get("anomalies", {})
@@ -1777,11 +2588,14 @@ class PostgreSQLBIAgent:
         
         return insights
     
-    def generate_business_report(self, output_format: str = "markdown") -> str:
-        """Generate comprehensive business intelligence report."""
-        print(f"\n{Colors.CYAN}{'='*60}{Colors.END}")
-        print(f"{Colors.CYAN}Generating Business Intelligence Report{Colors.END}")
-        print(f"{Colors.CYAN}{'='*60}{Colors.END}\n")
+    def generate_business_report(self, output_format: str = "markdown",
+                                 return_report: bool = True) -> Optional[str]:
+        """Generate comprehensive business intelligence report.
+
+        With ``return_report=False`` a Markdown report is streamed straight
+        into the output file and never held as one string; None is returned.
+        """
+        _print_section("Generating Business Intelligence Report")
         
         # Build report structure
         report = {
@@ -1805,16 +2619,20 @@ class PostgreSQLBIAgent:
             }
         }
         
-        # Format output
-        if output_format == "json":
-            report_str = json.dumps(report, indent=2, default=str)
-        else:
-            report_str = self._format_markdown_report(report)
-        
-        # Save report
+        # Format and save report
         output_file = self.output_dir / f"business_intelligence_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
-        with open(output_file, 'w') as f:
-            f.write(report_str)
+        if output_format != "json" and not return_report:
+            with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                report_str = self._format_markdown_report(report, out=f)
+        else:
+            if output_format == "json":
+                report_bytes = _json_bytes(report)
+                report_str = report_bytes.decode() if return_report else None
+            else:
+                report_str = self._format_markdown_report(report)
+                report_bytes = report_str.encode()
+            with open(output_file, 'wb') as f:
+                f.write(report_bytes)
         
         print(f"{Colors.GREEN}✓ Report saved to: {output_file}{Colors.END}\n")
         
@@ -1833,28 +2651,24 @@ class PostgreSQLBIAgent:
             "key_wins": []
         }
         
-        kpis = self.business_metrics.get("kpis", {})
-        ratios = self.business_metrics.get("ratios", {})
+        kpis = self.business_metrics.get("kpis") or {}
+        ratios = self.business_metrics.get("ratios") or {}
         
         summary["total_revenue"] = kpis.get("total_revenue", 0)
         summary["total_orders"] = kpis.get("total_orders", 0)
         summary["average_order_value"] = kpis.get("average_order_value", 0)
         
-        # Determine overall health
+        # Determine overall health (a missing metric never counts as healthy)
         health_score = 0
-        total_factors = 0
         
-        if kpis.get("revenue_growth_wo_w", 0) > 0:
+        if (growth := kpis.get("revenue_growth_wo_w")) is not None and growth > 0:
             health_score += 1
-        total_factors += 1
         
-        if ratios.get("return_rate", 100) < 10:
+        if (return_rate := ratios.get("return_rate")) is not None and return_rate < 10:
             health_score += 1
-        total_factors += 1
         
-        if kpis.get("avg_fulfillment_hours", 999) < 48:
+        if (fulfillment_hours := kpis.get("avg_fulfillment_hours")) is not None and fulfillment_hours < 48:
             health_score += 1
-        total_factors += 1
         
         if health_score >= 2:
             summary["overall_health"] = "healthy"
@@ -1864,10 +2678,13 @@ class PostgreSQLBIAgent:
             summary["overall_health"] = "needs_attention"
         
         # Critical alerts from insights
-        for insight in self.insights:
-            if insight.get("impact") == "high" and insight.get("type") == "risk":
+        for insight in self.insights or []:
+            if insight.get("impact") != "high":
+                continue
+            insight_type = insight.get("type")
+            if insight_type == "risk":
                 summary["critical_alerts"].append(insight["title"])
-            elif insight.get("impact") == "high" and insight.get("type") == "opportunity":
+            elif insight_type == "opportunity":
                 summary["key_wins"].append(insight["title"])
         
         return summary
@@ -1878,28 +2695,25 @@ class PostgreSQLBIAgent:
         
         # Revenue breakdown
         if "Revenue" in self.query_results:
-            revenue_data = self.query_results["Revenue"]
             analytics["revenue"] = {
-                "daily_trend": len(revenue_data.get("daily_revenue_trend", {}).get("data", [])),
-                "categories_analyzed": len(revenue_data.get("revenue_by_category", {}).get("data", [])),
-                "payment_methods": len(revenue_data.get("revenue_by_payment_method", {}).get("data", []))
+                "daily_trend": len(self._columns("Revenue", "daily_revenue_trend").get("revenue", ())),
+                "categories_analyzed": len(self._data("Revenue", "revenue_by_category")),
+                "payment_methods": len(self._data("Revenue", "revenue_by_payment_method"))
             }
         
         # Customer analysis
         if "Customer" in self.query_results:
-            customer_data = self.query_results["Customer"]
             analytics["customers"] = {
-                "segments_analyzed": len(customer_data.get("customer_segmentation", {}).get("data", [])),
-                "cohorts_analyzed": len(customer_data.get("customer_retention_cohort", {}).get("data", [])),
-                "activity_levels": len(customer_data.get("customer_activity_levels", {}).get("data", []))
+                "segments_analyzed": len(self._data("Customer", "customer_segmentation")),
+                "cohorts_analyzed": len(self._data("Customer", "customer_retention_cohort")),
+                "activity_levels": len(self._data("Customer", "customer_activity_levels"))
             }
         
         # Product analysis
         if "Product" in self.query_results:
-            product_data = self.query_results["Product"]
             analytics["products"] = {
-                "products_ranked": len(product_data.get("product_sales_ranking", {}).get("data", [])),
-                "categories_analyzed": len(product_data.get("category_performance", {}).get("data", []))
+                "products_ranked": len(self._data("Product", "product_sales_ranking")),
+                "categories_analyzed": len(self._data("Product", "category_performance"))
             }
         
         return analytics
@@ -1909,19 +2723,19 @@ class PostgreSQLBIAgent:
         recommendations = []
         
         for insight in self.insights:
-            if insight.get("impact") in ["high", "medium"]:
+            impact = insight.get("impact")
+            if impact in ("high", "medium"):
                 recommendations.append({
-                    "priority": "high" if insight.get("impact") == "high" else "medium",
+                    "priority": impact,
                     "title": insight.get("title", ""),
                     "description": insight.get("description", ""),
                     "action": insight.get("recommendation", "")
                 })
         
         # Add data-driven recommendations
-        kpis = self.business_metrics.get("kpis", {})
-        ratios = self.business_metrics.get("ratios", {})
+        aov = self.business_metrics.get("kpis", {}).get("average_order_value", 0)
         
-        if kpis.get("average_order_value", 0) < 100:
+        if aov < 100:
             recommendations.append({
                 "priority": "medium",
                 "title": "Increase Average Order Value",
@@ -1931,152 +2745,31 @@ class PostgreSQLBIAgent:
         
         return recommendations
     
-    def _format_markdown_report(self, report: Dict[str, Any]) -> str:
-        """Format report as Markdown."""
-        lines = []
-        
-        # Title
-        lines.append(f"# 📊 Business Intelligence Report")
-        lines.append(f"")
-        lines.append(f"**Generated:** {report['generated_at']}")
-        lines.append(f"**Analysis Period:** {report['analysis_period']}")
-        lines.append(f"**Database:** {report['database']}")
-        lines.append(f"")
-        
-        # Executive Summary
-        lines.append(f"## 🎯 Executive Summary")
-        lines.append(f"")
-        
+    def _format_markdown_report(self, report: Dict[str, Any],
+                                out: Optional[TextIO] = None) -> Optional[str]:
+        """Format report as Markdown by rendering the precompiled _MD_TEMPLATE.
+
+        Returns the text, or with ``out`` writes it there chunk by chunk as
+        the template produces it and returns None.
+        """
         summary = report['executive_summary']
-        health_emoji = "🟢" if summary['overall_health'] == "healthy" else ("🟡" if summary['overall_health'] == "stable" else "🔴")
-        lines.append(f"**Overall Health:** {health_emoji} {summary['overall_health'].upper()}")
-        lines.append(f"")
-        
-        # Key Metrics
-        lines.append(f"### Key Metrics")
-        lines.append(f"")
-        lines.append(f"| Metric | Value |")
-        lines.append(f"|--------|-------|")
-        lines.append(f"| Total Revenue | ${summary['total_revenue']:,.2f} |")
-        lines.append(f"| Total Orders | {summary['total_orders']:,} |")
-        lines.append(f"| Average Order Value | ${summary['average_order_value']:.2f} |")
-        lines.append(f"")
-        
-        # Critical Alerts
-        if summary['critical_alerts']:
-            lines.append(f"### 🚨 Critical Alerts")
-            lines.append(f"")
-            for alert in summary['critical_alerts']:
-                lines.append(f"- {alert}")
-            lines.append(f"")
-        
-        # Key Wins
-        if summary['key_wins']:
-            lines.append(f"### 🏆 Key Wins")
-            lines.append(f"")
-            for win in summary['key_wins']:
-                lines.append(f"- {win}")
-            lines.append(f"")
-        
-        # Key Metrics Detail
-        lines.append(f"## 📈 Key Performance Indicators")
-        lines.append(f"")
-        lines.append(f"| KPI | Value | Status |")
-        lines.append(f"|-----|-------|--------|")
-        
-        for kpi, value in report['key_metrics'].items():
-            kpi_name = kpi.replace("_", " ").title()
-            status = "✅" if value else "⚠️"
-            if "rate" in kpi.lower() or "ratio" in kpi.lower():
-                formatted_value = f"{value}%"
-            elif "revenue" in kpi.lower() or "value" in kpi.lower() or "ltv" in kpi.lower():
-                formatted_value = f"${value:,.2f}"
-            elif "orders" in kpi.lower():
-                formatted_value = f"{value:,.0f}"
-            else:
-                formatted_value = str(value)
-            lines.append(f"| {kpi_name} | {formatted_value} | {status} |")
-        
-        lines.append(f"")
-        
-        # Business Ratios
-        if report['business_ratios']:
-            lines.append(f"## 📊 Business Ratios")
-            lines.append(f"")
-            lines.append(f"| Ratio | Value | Benchmark |")
-            lines.append("|-------|-------|-----------|")
-            
-            benchmarks = {
-                "return_rate": ("Return Rate", "8-10%"),
-                "fulfillment_rate": ("Fulfillment Rate", ">95%"),
-                "high_value_ratio": ("High-Value Customer %", "15-20%"),
-                "conversion_rate": ("Conversion Rate", "2-5%")
-            }
-            
-            for ratio, value in report['business_ratios'].items():
-                ratio_display = ratio.replace("_", " ").title()
-                benchmark = benchmarks.get(ratio, ("", ""))[1]
-                formatted_value = f"{value}%" if value < 100 else f"{value:,.2f}"
-                lines.append(f"| {ratio_display} | {formatted_value} | {benchmark} |")
-            
-            lines.append(f"")
-        
-        # Insights
-        if report['insights']:
-            lines.append(f"## 💡 Insights & Analysis")
-            lines.append(f"")
-            
-            for i, insight in enumerate(report['insights'], 1):
-                emoji = "🚀" if insight['type'] == "opportunity" else ("⚠️" if insight['type'] == "risk" else "💡")
-                lines.append(f"### {emoji} {i}. {insight['title']}")
-                lines.append(f"")
-                lines.append(f"**Impact:** {insight['impact'].upper()}")
-                lines.append(f"")
-                lines.append(f"{insight['description']}")
-                lines.append(f"")
-                lines.append(f"**Recommendation:** {insight['recommendation']}")
-                lines.append(f"")
-        
-        # Recommendations
-        if report['recommendations']:
-            lines.append(f"## 🎯 Action Items")
-            lines.append(f"")
-            
-            for rec in report['recommendations']:
-                priority_emoji = "🔴" if rec['priority'] == "high" else "🟡"
-                lines.append(f"{priority_emoji} **{rec['title']}**")
-                lines.append(f"")
-                lines.append(f"{rec['action']}")
-                lines.append(f"")
-        
-        # Anomalies
-        anomalies = report.get('anomalies', {})
-        if anomalies.get('anomalies'):
-            lines.append(f"## 🔍 Detected Anomalies")
-            lines.append(f"")
-            
-            for anomaly in anomalies['anomalies']:
-                type_emoji = "📈" if anomaly['type'] == "spike" else "📉"
-                lines.append(f"{type_emoji} **{anomaly['metric'].title()}** - {anomaly['date']}")
-                lines.append(f"- Deviation: {anomaly['z_score']:.1f}σ from average")
-                lines.append(f"- Actual: {anomaly['actual_value']:,.2f} vs Expected: {anomaly['expected_value']:,.2f}")
-                lines.append(f"")
-        
-        # Metadata
-        lines.append(f"## 📋 Report Metadata")
-        lines.append(f"")
-        lines.append(f"- **Queries Executed:** {report['metadata']['total_queries']}")
-        lines.append(f"- **Successful Queries:** {report['metadata']['successful_queries']}")
-        lines.append(f"- **Tables Analyzed:** {report['metadata']['tables_analyzed']}")
-        lines.append(f"- **Relationships Discovered:** {report['metadata']['relationships_discovered']}")
-        lines.append(f"")
-        
-        # Footer
-        lines.append(f"---")
-        lines.append(f"*Report generated by PostgreSQL Business Intelligence Agent*")
-        lines.append(f"*Next report recommended in 7 days*")
-        
-        return "\n".join(lines)
+        health_emoji = _HEALTH_EMOJI.get(summary['overall_health'], "🔴")
+        context = dict(
+            report=report,
+            summary=summary,
+            health_emoji=health_emoji,
+            icon=_icon,
+            kpi_row=_kpi_row,
+            ratio_row=_ratio_row,
+            insight_emoji=_INSIGHT_EMOJI,
+            priority_emoji=_PRIORITY_EMOJI,
+            anomaly_emoji=_ANOMALY_EMOJI
+        )
+        
+        if out is None:
+            return _MD_TEMPLATE.render(context)
+        out.writelines(_MD_TEMPLATE.generate(context))
+        return None
     
     # =========================================================================
     # MAIN WORKFLOW
@@ -2084,11 +2777,11 @@ class PostgreSQLBIAgent:
     
     def run_full_analysis(self):
         """Execute the complete business intelligence analysis workflow."""
-        print(f"\n{Colors.BOLD}{Colors.CYAN}")
-        print("╔════════════════════════════════════════════════════════════════╗")
-        print("║     PostgreSQL Business Intelligence Agent v1.0                ║")
-        print("╚════════════════════════════════════════════════════════════════╝")
-        print(f"{Colors.END}\n")
+        print(f"\n{Colors.BOLD}{Colors.CYAN}\n"
+              "╔════════════════════════════════════════════════════════════════╗\n"
+              "║     PostgreSQL Business Intelligence Agent v1.0                ║\n"
+              "╚════════════════════════════════════════════════════════════════╝\n"
+              f"{Colors.END}\n")
         
         # Step 1: Connect to database
         if not self.connect():
@@ -2132,38 +2825,38 @@ class PostgreSQLBIAgent:
             self.generate_insights()
             
             # Step 12: Generate report
-            report = self.generate_business_report()
+            self.generate_business_report(return_report=False)
             
-            # Print report summary
-            print(f"\n{Colors.BOLD}{Colors.GREEN}")
-            print("╔════════════════════════════════════════════════════════════════╗")
-            print("║                    ANALYSIS COMPLETE                            ║")
-            print("╚════════════════════════════════════════════════════════════════╝")
-            print(f"{Colors.END}\n")
-            
-            # Print quick stats
+            # Report summary banner, quick stats, key metrics and top
+            # insights are collected and printed in one write
             summary = self.metadata.get("execution_summary", {})
-            print(f"📊 Queries: {summary.get('total_queries', 0)} executed "
-                  f"({summary.get('successful', 0)} successful)")
-            print(f"💰 KPIs Identified: {len(self.business_metrics.get('kpis', {}))}")
-            print(f"⚠️  Insights Generated: {len(self.insights)}")
-            print(f"🚨 Anomalies Detected: {len(self.metadata.get('anomalies', {}).get('anomalies', []))}")
-            print()
-            
-            # Print key metrics
-            print(f"{Colors.CYAN}Key Metrics:{Colors.END}")
             kpis = self.business_metrics.get("kpis", {})
-            for kpi, value in list(kpis.items())[:5]:
-                print(f"  - {kpi.replace('_', ' ').title()}: {value}")
-            print()
-            
-            # Print top insights
-            if self.insights:
-                print(f"{Colors.CYAN}Top Insights:{Colors.END}")
-                for insight in self.insights[:3]:
-                    emoji = "🚀" if insight['type'] == "opportunity" else "⚠️"
-                    print(f"  {emoji} {insight['title']}")
-                print()
+            anomalies = self.metadata.get("anomalies", {}).get("anomalies", [])
+            insights = self.insights
+            lines = [
+                f"\n{Colors.BOLD}{Colors.GREEN}",
+                "╔════════════════════════════════════════════════════════════════╗",
+                "║                    ANALYSIS COMPLETE                            ║",
+                "╚════════════════════════════════════════════════════════════════╝",
+                f"{Colors.END}\n",
+                f"{_icon('📊')}Queries: {summary.get('total_queries', 0)} executed "
+                f"({summary.get('successful', 0)} successful)",
+                f"{_icon('💰')}KPIs Identified: {len(kpis)}",
+                f"{_icon('⚠️ ')}Insights Generated: {len(insights)}",
+                f"{_icon('🚨')}Anomalies Detected: {len(anomalies)}",
+                "",
+                f"{Colors.CYAN}Key Metrics:{Colors.END}",
+                *(f"  - {kpi.replace('_', ' ').title()}: {value}" for kpi, value in islice(kpis.items(), 5)),
+                ""
+            ]
+            if insights:
+                lines.append(f"{Colors.CYAN}Top Insights:{Colors.END}")
+                lines.extend(
+                    f"  {_icon(_INSIGHT_EMOJI.get(insight['type'], '⚠️'))}{insight['title']}"
+                    for insight in islice(insights, 3)
+                )
+                lines.append("")
+            print("\n".join(lines))
             
             return True
             
@@ -2190,6 +2883,9 @@ Examples:
   
   # Generate JSON report
   python3 business_intelligence_agent.py --skill generate_business_report --format json
+  
+  # Reuse query results cached within the last hour
+  python3 business_intelligence_agent.py --full-analysis --cache-ttl 3600
         """
     )
     
@@ -2207,19 +2903,28 @@ Examples:
     parser.add_argument("--date-range", type=int, default=30,
                        help="Analysis date range in days")
     parser.add_argument("--tables", help="Comma-separated list of tables to analyze")
+    parser.add_argument("--materialize", action="store_true",
+                       help="Serve heavy multi-join aggregates from materialized views")
+    parser.add_argument("--cache-ttl", type=int, default=0,
+                       help="Reuse cached query results younger than this many seconds (default: off)")
+    parser.add_argument("--no-cache", action="store_true",
+                       help="Always run queries against the database")
+    parser.add_argument("--plain", action="store_true",
+                       help="No ANSI colors or emoji (implied when stdout is not a terminal)")
     
     args = parser.parse_args()
     
+    if args.plain or not sys.stdout.isatty():
+        _use_plain_output()
+    
     # Load configuration - use environment variables first
-    import os
     config = DatabaseConfig()
     
     if os.environ.get('PGHOST'):
-        config.host = os.environ.get('PGHOST', '127.0.0.1')
-        config.port = int(os.environ.get('PGPORT', 5432))
-        config.user = os.environ.get('PGUSER', 'digoal')
-        config.password = os.environ.get('PGPASSWORD', '')
-        config.database = os.environ.get('PGDATABASE', 'postgres')
+        for env, (attr, cast) in _CFG.items():
+            value = os.environ.get(env)
+            if value:
+                setattr(config, attr, cast(value))
     else:
         # Try config file
         config_path = Path(__file__).parent / args.config
@@ -2227,39 +2932,22 @@ Examples:
             with open(config_path, 'r') as f:
                 for line in f:
                     line = line.strip()
-                    if line and not line.startswith('#') and '=' in line:
-                        key, value = line.split('=', 1)
-                        key = key.strip()
-                        value = value.strip()
-                        
-                        if key == "PGHOST":
-                            config.host = value
-                        elif key == "PGPORT":
-                            config.port = int(value)
-                        elif key == "PGUSER":
-                            config.user = value
-                        elif key == "PGPASSWORD":
-                            config.password = value
-                        elif key == "PGDATABASE":
-                            config.database = value
-                    
-                    if key == "PGHOST":
-                        config.host = value
-                    elif key == "PGPORT":
-                        config.port = int(value)
-                    elif key == "PGUSER":
-                        config.user = value
-                    elif key == "PGPASSWORD":
-                        config.password = value
-                    elif key == "PGDATABASE":
-                        config.database = value
+                    if not line or line.startswith('#') or '=' not in line:
+                        continue
+                    key, _, value = line.partition('=')
+                    spec = _CFG.get(key.strip())
+                    if spec:
+                        attr, cast = spec
+                        setattr(config, attr, cast(value.strip()))
     
     # Initialize agent
     agent = PostgreSQLBIAgent(
         config=config,
         sample_size=args.sample_size,
         date_range_days=args.date_range,
-        output_dir=args.output
+        output_dir=args.output,
+        materialize_views=args.materialize,
+        cache_ttl=0 if args.no_cache else args.cache_ttl
     )
     
     # Execute
@@ -2269,38 +2957,65 @@ Examples:
         if not agent.connect():
             sys.exit(1)
         
+        profiling_steps = {
+            "discover_database_metadata": agent.discover_database_metadata,
+            "identify_business_tables": agent.identify_business_tables,
+            "sample_table_data": agent.sample_table_data,
+            "detect_data_patterns": agent.detect_data_patterns,
+            "infer_business_context": agent.infer_business_context
+        }
+        
+        query_generators = {
+            "generate_revenue_queries": ("revenue", agent.generate_revenue_queries),
+            "generate_customer_analytics_queries": ("customer analytics", agent.generate_customer_analytics_queries),
+            "generate_product_analytics_queries": ("product analytics", agent.generate_product_analytics_queries),
+            "generate_operational_analytics_queries": ("operational analytics", agent.generate_operational_analytics_queries),
+            "generate_marketing_analytics_queries": ("marketing analytics", agent.generate_marketing_analytics_queries)
+        }
+        
+        def profile(through: str = "infer_business_context") -> Any:
+            """Run the profiling chain up to ``through``; finished steps are memoized."""
+            for name, step in profiling_steps.items():
+                result = step()
+                if name == through:
+                    return result
+        
+        def execute_queries() -> Dict[str, Any]:
+            """Generate and run every BI query category on the profiled database."""
+            profile("identify_business_tables")
+            return agent.execute_all_queries({
+                "Revenue": agent.generate_revenue_queries(),
+                "Customer": agent.generate_customer_analytics_queries(),
+                "Product": agent.generate_product_analytics_queries(),
+                "Operations": agent.generate_operational_analytics_queries(),
+                "Marketing": agent.generate_marketing_analytics_queries()
+            })
+        
         try:
-            if args.skill == "discover_database_metadata":
-                metadata = agent.discover_database_metadata()
-                print(json.dumps(metadata, indent=2))
-            elif args.skill == "identify_business_tables":
-                tables = agent.identify_business_tables()
-                print(json.dumps(tables, indent=2))
-            elif args.skill == "sample_table_data":
-                samples = agent.sample_table_data()
-                print(json.dumps(samples, indent=2))
-            elif args.skill == "detect_data_patterns":
-                patterns = agent.detect_data_patterns()
-                print(json.dumps(patterns, indent=2))
-            elif args.skill == "infer_business_context":
-                context = agent.infer_business_context()
-                print(json.dumps(context, indent=2))
-            elif args.skill == "generate_revenue_queries":
-                queries = agent.generate_revenue_queries()
-                print(json.dumps([{"name": q.name, "sql": q.sql} for q in queries], indent=2))
-            elif args.skill == "generate_customer_analytics_queries":
-                queries = agent.generate_customer_analytics_queries()
-                print(json.dumps([{"name": q.name, "sql": q.sql} for q in queries], indent=2))
-            elif args.skill == "generate_product_analytics_queries":
-                queries = agent.generate_product_analytics_queries()
-                print(json.dumps([{"name": q.name, "sql": q.sql} for q in queries], indent=2))
-            elif args.skill == "generate_operational_analytics_queries":
-                queries = agent.generate_operational_analytics_queries()
-                print(json.dumps([{"name": q.name, "sql": q.sql} for q in queries], indent=2))
-            elif args.skill == "generate_marketing_analytics_queries":
-                queries = agent.generate_marketing_analytics_queries()
-                print(json.dumps([{"name": q.name, "sql": q.sql} for q in queries], indent=2))
+            if args.skill in profiling_steps:
+                print(json.dumps(profile(args.skill), indent=2))
+            elif args.skill in query_generators:
+                profile("identify_business_tables")
+                label, generate = query_generators[args.skill]
+                _print_section(f"Generating {label.title()} Queries")
+                queries = [q.to_dict() for q in generate()]
+                print(f"{Colors.GREEN}✓ Generated {len(queries)} {label} queries{Colors.END}\n")
+                print(json.dumps(queries, indent=2))
             elif args.skill == "execute_bi_queries":
+                results = execute_queries()
+                print(_json_bytes(results).decode())
+            elif args.skill == "refresh_materialized_views":
+                agent.materialize_views = True
+                profile("discover_database_metadata")
+                query_lists = {
+                    "Revenue": agent.generate_revenue_queries(),
+                    "Customer": agent.generate_customer_analytics_queries(),
+                    "Product": agent.generate_product_analytics_queries()
+                }
+                refreshed = agent.refresh_materialized_views(query_lists)
+                print(json.dumps(refreshed, indent=2))
+            elif args.skill == "apply_setup_sql":
+                profile("discover_database_metadata")
                 query_lists = {
                     "Revenue": agent.generate_revenue_queries(),
                     "Customer": agent.generate_customer_analytics_queries(),
@@ -2308,35 +3023,25 @@ Examples:
                     "Operations": agent.generate_operational_analytics_queries(),
                     "Marketing": agent.generate_marketing_analytics_queries()
                 }
-                results = agent.execute_all_queries(query_lists)
-                print(json.dumps(results, indent=2, default=str))
+                applied = agent.apply_setup_sql(query_lists)
+                print(json.dumps(applied, indent=2))
             elif args.skill == "calculate_business_metrics":
-                agent.discover_database_metadata()
-                agent.identify_business_tables()
+                execute_queries()
                 metrics = agent.calculate_business_metrics()
-                print(json.dumps(metrics, indent=2))
+                print(_json_bytes(metrics).decode())
             elif args.skill == "detect_anomalies":
+                execute_queries()
                 anomalies = agent.detect_anomalies()
-                print(json.dumps(anomalies, indent=2))
+                print(_json_bytes(anomalies).decode())
             elif args.skill == "generate_insights":
-                agent.discover_database_metadata()
-                agent.identify_business_tables()
+                execute_queries()
+                agent.calculate_business_metrics()
+                agent.detect_anomalies()
                 insights = agent.generate_insights()
-                print(json.dumps(insights, indent=2))
+                print(_json_bytes(insights).decode())
             elif args.skill == "generate_business_report":
-                agent.discover_database_metadata()
-                agent.identify_business_tables()
-                agent.sample_table_data()
-                agent.detect_data_patterns()
-                agent.infer_business_context()
-                query_lists = {
-                    "Revenue": agent.generate_revenue_queries(),
-                    "Customer": agent.generate_customer_analytics_queries(),
-                    "Product": agent.generate_product_analytics_queries(),
-                    "Operations": agent.generate_operational_analytics_queries(),
-                    "Marketing": agent.generate_marketing_analytics_queries()
-                }
-                agent.execute_all_queries(query_lists)
+                profile()
+                execute_queries()
                 agent.calculate_business_metrics()
                 agent.detect_anomalies()
                 agent.generate_insights()